@@ -0,0 +1,42 @@
+# POST /actions/batch: actions a client queued (offline, or tapping fast) are
+# reduced to their net effect before anything is written. Per video (likes)
+# and per target (follows) only the last action counts: like then unlike is
+# an unlike, which is also what applying both in order would leave. An
+# action re-sent with the same client_id is applied once.
+
+TOGGLES = {"like": ("likes", True), "unlike": ("likes", False), "follow": ("follows", True), "unfollow": ("follows", False)}
+
+
+class Plan:
+    def __init__(self):
+        self.likes = {}  # video_id -> (index of the deciding action, liked)
+        self.follows = {}  # target_id -> (index, following)
+        self.comments = []  # indexes, in order
+        self.same_as = {}  # index of a re-sent action -> index of the first one
+        self.errors = {}  # index -> message
+
+
+def collapse(user_id, actions):
+    plan = Plan()
+    first = {}
+    for i, a in enumerate(actions):
+        if a.client_id:
+            if a.client_id in first:
+                plan.same_as[i] = first[a.client_id]
+                continue
+            first[a.client_id] = i
+        if a.type == "comment":
+            if a.video_id and (a.text or "").strip():
+                plan.comments.append(i)
+            else:
+                plan.errors[i] = "missing video_id or text"
+            continue
+        group, on = TOGGLES[a.type]
+        key = a.video_id if group == "likes" else a.target_id
+        if not key:
+            plan.errors[i] = "missing video_id" if group == "likes" else "missing target_id"
+        elif group == "follows" and key == user_id:
+            plan.errors[i] = "cannot follow self"
+        else:
+            getattr(plan, group)[key] = (i, on)  # a later action replaces an earlier one
+    return plan
@@ -1,11 +1,61 @@
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
-import boto3, os, time, re
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
+from pydantic import BaseModel
+from typing import Literal
+from contextlib import asynccontextmanager
+import asyncio, os, re, shutil, tempfile, time
 from uuid import uuid4
 from dotenv import load_dotenv
-from supabase import create_client
 
-app = FastAPI()
+# before the imports below read their settings; real env vars win
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "keys.env"))
+
+from repo import make_repo, encode_cursor, decode_cursor
+from counters import CounterBuffer
+from uploads import start_multipart, finish_multipart, abort_multipart
+from cache import make_cache
+from middleware import ETagMiddleware
+from generation import GenerationQueue, QueueFull, make_provider
+from feed import for_you_page, decode_feed_cursor
+from transcode import TranscodeQueue, transcode, outputs
+from thumbs import FORMATS, snap_width, variant_key, render
+from clients import CircuitOpen, make_executor, make_s3_client, s3_policy
+from metrics import MetricsMiddleware, collected, render as render_metrics, timed
+from logs import get_logger, setup_logging, stop_logging
+from live import Hub
+from actions import collapse
+
+setup_logging()
+log = get_logger("app")
+
+@asynccontextmanager
+async def lifespan(app):
+    global s3
+    # sized to the S3 connection pool; see clients.py
+    asyncio.get_running_loop().set_default_executor(make_executor())
+    # clients are built per worker process, after any fork: their pools,
+    # sockets and threads can't be shared between processes
+    s3, _ = await asyncio.gather(asyncio.to_thread(make_s3_client), repo.connect())
+    live.start()
+    lifecycle["started"] = True
+    yield
+    start_draining()
+    await generator.stop()
+    if transcoder:
+        await transcoder.stop()
+    if counters:
+        await counters.close()
+    await repo.close()
+    live.stop()
+    stop_logging()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(CircuitOpen)
+async def dependency_down(request, exc):
+    return JSONResponse({"detail": str(exc)}, 503, headers={"Retry-After": "10"})
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,21 +64,127 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# added last = runs first: bodies are ETagged uncompressed, then gzipped
+app.add_middleware(ETagMiddleware)
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_SIZE", "1024")), compresslevel=6)
+# outermost: times the whole request and sees the bytes actually sent
+app.add_middleware(MetricsMiddleware)
+
+s3 = None  # boto3 client, created in lifespan
+storage = s3_policy()
+BUCKET = os.getenv("BUCKET_NAME", "giggles-s3-bucket")
+S3_UPLOAD_DEADLINE = float(os.getenv("S3_UPLOAD_DEADLINE", "600"))  # whole-file transfers
+
+def object_url(key):
+    return f"https://{BUCKET}.s3.amazonaws.com/{key}"
+
+async def s3_call(fn, *args, idempotent=True, deadline=None, attempts=None, **kw):
+    # boto3 blocks: run it on the executor, under the storage retry/breaker policy
+    with timed("s3", fn.__name__):
+        return await storage.call(lambda: asyncio.to_thread(fn, *args, **kw), idempotent, deadline, attempts)
+
+def read_object(key):
+    return s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
 
-load_dotenv("keys.env")
+# DATA_BACKEND=sqlite runs against a local SQLite copy of the schema
+repo = make_repo()
 
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    region_name=os.getenv("AWS_REGION"),
+# GET /ws pushes count/comment changes to clients watching a video.
+# LIVE_BROKER_DIR shares them between the workers on this host.
+live = Hub(
+    float(os.getenv("LIVE_COALESCE_MS", "250")) / 1000,
+    int(os.getenv("LIVE_MAX_VIDEOS", "200")),
+    os.getenv("LIVE_BROKER_DIR"),
 )
-BUCKET = os.getenv("BUCKET_NAME", "giggles-s3-bucket")
 
+def publish_counts(counts):
+    for vid, (likes, comments) in counts.items():
+        live.publish(vid, like_count=likes, comment_count=comments)
+    # the flushed counters are now on the rows; drop responses that embed the old ones
+    cache.invalidate(*(f"video:{vid}" for vid in counts))
+
+# COUNTER_WRITE_BEHIND=1 coalesces like/comment counter bumps into periodic flushes
+counters = (
+    CounterBuffer(repo, float(os.getenv("COUNTER_FLUSH_SECONDS", "1.0")), on_flush=publish_counts)
+    if os.getenv("COUNTER_WRITE_BEHIND") == "1"
+    else None
+)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  
-sb = create_client(SUPABASE_URL, SUPABASE_KEY)
+# CACHE_BACKEND=memory (default) | sqlite (shared by local workers) | off
+cache = make_cache()
+CACHE_TTLS = {"feed": 5, "video": 15, "user": 30, "user_videos": 30, "likes": 30, "images": 60}
+
+async def fallback(coro, default):
+    # for independent sub-queries run with gather: a failed one just uses its default
+    try:
+        return await coro
+    except Exception:
+        return default
+
+# For You feed: uploads are pushed into followers' timelines unless the
+# creator has more than FANOUT_MAX_FOLLOWERS (then they are read per request)
+FANOUT_MAX_FOLLOWERS = int(os.getenv("FANOUT_MAX_FOLLOWERS", "10000"))
+TIMELINE_BACKFILL = int(os.getenv("TIMELINE_BACKFILL", "50"))
+FEED_TRENDING_EVERY = int(os.getenv("FEED_TRENDING_EVERY", "3"))
+
+async def save_video(row):
+    if transcoder:
+        row["media_status"] = "pending"
+    await repo.insert_video(row)
+    # a failed fan-out only keeps the video out of timelines; the upload itself stands
+    await fallback(repo.fanout_video(row["id"], FANOUT_MAX_FOLLOWERS), 0)
+    cache.invalidate("feed", f"user:{row['user_id']}", f"user_videos:{row['user_id']}")
+    if transcoder and not transcoder.submit(row):
+        await fallback(repo.update_video(row["id"], media_status="skipped"), None)
+
+# Transcoding: after upload, ffmpeg turns the original into HLS renditions, a
+# poster and an animated preview under media/{user_id}/{video_id}/.
+# TRANSCODE_WORKERS=0 (or no ffmpeg on PATH) leaves videos as uploaded.
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "1"))
+TRANSCODE_TIMEOUT = float(os.getenv("TRANSCODE_TIMEOUT", "600"))
+TRANSCODE_THREADS = int(os.getenv("TRANSCODE_THREADS", "0"))  # per ffmpeg process, 0 = auto
+
+async def upload_outputs(out, prefix):
+    sem = asyncio.Semaphore(8)
+
+    async def put(path, key, content_type):
+        async with sem:
+            # every output lives under a per-video prefix and never changes
+            extra = {"ContentType": content_type, "CacheControl": "public, max-age=31536000, immutable"}
+            await s3_call(s3.upload_file, path, BUCKET, key, ExtraArgs=extra)
+
+    await asyncio.gather(*(put(path, f"{prefix}/{rel}", ct) for path, rel, ct in outputs(out)))
+
+async def process_video(row):
+    vid, user_id = row["id"], row["user_id"]
+    prefix = f"media/{user_id}/{vid}"
+    try:
+        await repo.update_video(vid, media_status="processing")
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "source")
+            await s3_call(s3.download_file, BUCKET, row["s3_key"], src, deadline=S3_UPLOAD_DEADLINE)
+            out = os.path.join(tmp, "out")
+            await transcode(src, out, timeout=TRANSCODE_TIMEOUT, threads=TRANSCODE_THREADS)
+            await upload_outputs(out, prefix)
+        await repo.update_video(
+            vid,
+            media_status="ready",
+            hls_url=object_url(f"{prefix}/master.m3u8"),
+            poster_url=object_url(f"{prefix}/poster.jpg"),
+            preview_url=object_url(f"{prefix}/preview.webp"),
+        )
+    except Exception:
+        log.warning("transcode failed", extra={"video": vid}, exc_info=True)
+        # the original upload is still playable from `url`
+        await fallback(repo.update_video(vid, media_status="failed"), None)
+    cache.invalidate("feed", f"video:{vid}", f"user_videos:{user_id}")
+
+transcoder = (
+    TranscodeQueue(process_video, TRANSCODE_WORKERS, int(os.getenv("TRANSCODE_MAX_PENDING", "100")))
+    if TRANSCODE_WORKERS > 0 and shutil.which("ffmpeg")
+    else None
+)
 
 @app.post("/uploads")
 async def upload(
@@ -39,156 +195,320 @@ async def upload(
     vid = str(uuid4())
     key = f"uploads/{user_id}/{vid}_{file.filename}"
     try:
-        s3.upload_fileobj(file.file, BUCKET, key, ExtraArgs={"ContentType": file.content_type})
-        url = f"https://{BUCKET}.s3.amazonaws.com/{key}"
-        sb.table("videos").insert({"id": vid, "user_id": user_id, "s3_key": key, "url": url, "caption": caption}).execute()
+        # the request body stream can't be replayed, so a single attempt
+        await s3_call(
+            s3.upload_fileobj, file.file, BUCKET, key,
+            ExtraArgs={"ContentType": file.content_type}, deadline=S3_UPLOAD_DEADLINE, attempts=1,
+        )
+        url = object_url(key)
+        await save_video({"id": vid, "user_id": user_id, "s3_key": key, "url": url, "caption": caption})
         return {"id": vid, "key": key, "url": url}
+    except CircuitOpen:
+        raise
     except Exception as e:
         raise HTTPException(500, str(e))
 
-# Feed
-@app.get("/videos")
-def list_videos(limit: int = 20, cursor: str | None = None):
-    q = sb.table("videos").select("*, users!videos_user_id_fkey(username)")
-    if cursor:
-        # simple keyset on created_at if you stored it; else omit
-        q = q.lt("created_at", cursor)
-    data = q.execute().data
-    return {"videos": data}
-
-# Video detail
-@app.get("/videos/{video_id}")
-def video_detail(video_id: str, comments_limit: int = 10):
-    # video + uploader username; return JSON 404 if not found
+# Direct-to-S3 uploads: presign -> client PUTs the parts to S3 -> complete
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_URL_TTL = int(os.getenv("UPLOAD_URL_TTL", "3600"))
+UPLOAD_PREFIX = {"video": "uploads", "image": "images"}
+
+class PresignRequest(BaseModel):
+    user_id: str
+    filename: str
+    content_type: str
+    size: int
+    kind: Literal["video", "image"] = "video"
+
+class UploadPart(BaseModel):
+    part_number: int
+    etag: str
+
+class CompleteRequest(BaseModel):
+    user_id: str
+    id: str
+    key: str
+    upload_id: str
+    parts: list[UploadPart]
+    kind: Literal["video", "image"] = "video"
+    size: int | None = None
+    caption: str | None = None
+
+class AbortRequest(BaseModel):
+    user_id: str
+    id: str
+    key: str
+    upload_id: str
+    kind: Literal["video", "image"] = "video"
+
+def owns_key(kind, user_id, obj_id, key):
+    return key.startswith(f"{UPLOAD_PREFIX[kind]}/{user_id}/{obj_id}_")
+
+@app.post("/uploads/presign")
+async def presign_upload(body: PresignRequest):
+    if body.size <= 0:
+        raise HTTPException(400, "size must be positive")
+    obj_id = str(uuid4())
+    key = f"{UPLOAD_PREFIX[body.kind]}/{body.user_id}/{obj_id}_{body.filename}"
     try:
-        v_resp = (
-            sb.table("videos")
-            .select("*, users!videos_user_id_fkey(username)")
-            .eq("id", video_id)
-            .single()
-            .execute()
+        # not retried after a timeout: a second attempt would leave an orphaned upload
+        plan = await s3_call(
+            start_multipart, s3, BUCKET, key, body.content_type, body.size, UPLOAD_PART_SIZE, UPLOAD_URL_TTL,
+            idempotent=False,
         )
-        v = v_resp.data
+    except CircuitOpen:
+        raise
     except Exception as e:
-        raise HTTPException(404, "video not found")
+        raise HTTPException(500, f"failed to start upload: {e}")
+    return {"id": obj_id, "key": key, **plan}
 
-    if not v:
-        raise HTTPException(404, "video not found")
+@app.post("/uploads/complete")
+async def complete_upload(body: CompleteRequest):
+    if not owns_key(body.kind, body.user_id, body.id, body.key):
+        raise HTTPException(400, "key does not belong to this upload")
+    try:
+        parts = [p.model_dump() for p in body.parts]
+        head = await s3_call(finish_multipart, s3, BUCKET, body.key, body.upload_id, parts, body.size, idempotent=False)
+    except ValueError as e:
+        raise HTTPException(400, f"upload incomplete: {e}")
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"failed to complete upload: {e}")
 
-    like_count = int(v.get("like_count") or 0)
-    comment_count = int(v.get("comment_count") or 0)
-    if like_count == 0:
-        try:
-            like_count = (
-                sb.table("likes").select("*", count="exact").eq("video_id", video_id).execute().count
-                or 0
-            )
-        except Exception:
-            like_count = 0
-    if comment_count == 0:
-        try:
-            comment_count = (
-                sb.table("comments").select("*", count="exact").eq("video_id", video_id).execute().count
-                or 0
+    url = object_url(body.key)
+    try:
+        if body.kind == "video":
+            await save_video(
+                {"id": body.id, "user_id": body.user_id, "s3_key": body.key, "url": url, "caption": body.caption}
             )
-        except Exception:
-            comment_count = 0
-    cs = []
+            return {"id": body.id, "key": body.key, "url": url}
+        row = {
+            "id": body.id,
+            "user_id": body.user_id,
+            "storage_path": body.key,
+            "url": url,
+            "mime_type": head.get("ContentType"),
+        }
+        if body.caption:
+            row["caption"] = body.caption
+        await repo.insert_image(row)
+        cache.invalidate(f"images:{body.user_id}")
+        return {"image": row}
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"failed to save upload: {e}")
+
+@app.post("/uploads/abort")
+async def abort_upload(body: AbortRequest):
+    if not owns_key(body.kind, body.user_id, body.id, body.key):
+        raise HTTPException(400, "key does not belong to this upload")
     try:
-        cs = (
-            sb.table("comments")
-            .select("id, user_id, text, created_at, username, users!comments_user_id_fkey(username)")
-            .eq("video_id", video_id)
-            .order("created_at", desc=True)
-            .limit(comments_limit)
-            .execute()
-            .data
-            or []
-        )
-    except Exception:
-        cs = []
+        await s3_call(abort_multipart, s3, BUCKET, body.key, body.upload_id)
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"failed to abort upload: {e}")
+    return {"ok": True}
+
+# Feed
+FEED_MAX_PAGE = 50
+
+@app.get("/videos")
+@cache.route(CACHE_TTLS["feed"], "feed:{limit}:{cursor}", tags=["feed"])
+async def list_videos(limit: int = 20, cursor: str | None = None):
+    limit = max(1, min(limit, FEED_MAX_PAGE))
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(400, "invalid cursor")
+    # one extra row tells us whether there is another page
+    rows = await repo.list_videos(limit + 1, after)
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {"videos": rows[:limit], "next_cursor": next_cursor}
+
+# Personalised feed: followed creators' uploads mixed with trending videos
+@app.get("/feed/{user_id}")
+@cache.route(CACHE_TTLS["feed"], "for_you:{user_id}:{limit}:{cursor}", tags=["feed", "for_you:{user_id}"])
+async def for_you(user_id: str, limit: int = 20, cursor: str | None = None):
+    limit = max(1, min(limit, FEED_MAX_PAGE))
+    try:
+        state = decode_feed_cursor(cursor) if cursor else {}
+    except ValueError:
+        raise HTTPException(400, "invalid cursor")
+    try:
+        return await for_you_page(repo, user_id, limit, state, FEED_TRENDING_EVERY, FANOUT_MAX_FOLLOWERS)
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"failed to load feed: {e}")
+
+# Video detail
+@app.get("/videos/{video_id}")
+@cache.route(CACHE_TTLS["video"], "video:{video_id}:{comments_limit}", tags=["video:{video_id}"])
+async def video_detail(video_id: str, comments_limit: int = 10):
+    # video + uploader username and comments in parallel; return JSON 404 if not found
+    v, cs = await asyncio.gather(
+        repo.get_video(video_id),
+        fallback(repo.list_comments(video_id, comments_limit), []),
+    )
+    if not v:
+        raise HTTPException(404, "video not found")
 
-    v["like_count"] = like_count
-    v["comment_count"] = comment_count
+    v["like_count"] = int(v.get("like_count") or 0)
+    v["comment_count"] = int(v.get("comment_count") or 0)
+    recount = {}
+    if v["like_count"] == 0:
+        recount["like_count"] = fallback(repo.count_likes(video_id), 0)
+    if v["comment_count"] == 0:
+        recount["comment_count"] = fallback(repo.count_comments(video_id), 0)
+    if recount:
+        v.update(zip(recount, await asyncio.gather(*recount.values())))
     return {"video": v, "comments": cs}
 
+# Many videos at once: uploader, counters and optional top-N comments in a
+# fixed number of queries no matter how many ids are asked for
+BATCH_MAX_IDS = 200
+
+class VideoBatch(BaseModel):
+    ids: list[str]
+    comments_limit: int = 0
+
+async def hydrate_videos(ids, comments_limit=0):
+    ids = list(dict.fromkeys(i for i in ids if i))[:BATCH_MAX_IDS]
+    if not ids:
+        return []
+    rows = await repo.get_videos(ids, max(0, min(comments_limit, 100)))
+    # same fallback as video_detail: recount when the stored counter is unset
+    no_likes = [v["id"] for v in rows if not v.get("like_count")]
+    no_comments = [v["id"] for v in rows if not v.get("comment_count")]
+    likes, comments = await asyncio.gather(
+        repo.count_likes_many(no_likes) if no_likes else asyncio.sleep(0, {}),
+        repo.count_comments_many(no_comments) if no_comments else asyncio.sleep(0, {}),
+    )
+    for v in rows:
+        v["like_count"] = int(v.get("like_count") or likes.get(v["id"], 0))
+        v["comment_count"] = int(v.get("comment_count") or comments.get(v["id"], 0))
+    by_id = {v["id"]: v for v in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+@app.post("/videos/batch")
+async def videos_batch(body: VideoBatch):
+    try:
+        return {"videos": await hydrate_videos(body.ids, body.comments_limit)}
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"failed to load videos: {e}")
+
 # Like / Unlike
 @app.post("/videos/{video_id}/like")
-def like(video_id: str, user_id: str):
-    sb.table("likes").upsert({"video_id": video_id, "user_id": user_id}).execute()
-    lc = (
-        sb.table("likes").select("*", count="exact").eq("video_id", video_id).execute().count
-        or 0
-    )
-    sb.table("videos").update({"like_count": lc}).eq("id", video_id).execute()
+async def like(video_id: str, user_id: str):
+    if counters:
+        lc, _ = await counters.add(video_id, likes=1 if await repo.add_like(video_id, user_id) else 0)
+    else:
+        lc = await repo.like(video_id, user_id)
+    cache.invalidate(f"video:{video_id}", f"likes:{user_id}")
+    live.publish(video_id, like_count=lc)
     return {"ok": True, "like_count": lc}
 
 @app.delete("/videos/{video_id}/like")
-def unlike(video_id: str, user_id: str):
-    sb.table("likes").delete().eq("video_id", video_id).eq("user_id", user_id).execute()
-    lc = (
-        sb.table("likes").select("*", count="exact").eq("video_id", video_id).execute().count
-        or 0
-    )
-    sb.table("videos").update({"like_count": lc}).eq("id", video_id).execute()
+async def unlike(video_id: str, user_id: str):
+    if counters:
+        lc, _ = await counters.add(video_id, likes=-1 if await repo.remove_like(video_id, user_id) else 0)
+    else:
+        lc = await repo.unlike(video_id, user_id)
+    cache.invalidate(f"video:{video_id}", f"likes:{user_id}")
+    live.publish(video_id, like_count=lc)
     return {"ok": True, "like_count": lc}
 
 
+# Live updates: {"subscribe": [ids]} / {"unsubscribe": [ids]} in,
+# {"type": "delta", "videos": {id: {like_count, comment_count, comments}}} out
+@app.websocket("/ws")
+async def live_updates(ws: WebSocket, videos: str = ""):
+    await ws.accept()
+    try:
+        await live.serve(ws, [v for v in videos.split(",") if v])
+    except WebSocketDisconnect:
+        pass
+
 # All videos liked by a user
 @app.get("/users/{user_id}/likes")
-def user_likes(user_id: str, limit: int = 1000):
+@cache.route(CACHE_TTLS["likes"], "likes:{user_id}:{limit}", tags=["likes:{user_id}"])
+async def user_likes(user_id: str, limit: int = 1000):
     try:
-        rows = (
-            sb.table("likes")
-            .select("video_id")
-            .eq("user_id", user_id)
-            .limit(limit)
-            .execute()
-            .data
-            or []
-        )
-        return {"video_ids": [r.get("video_id") for r in rows if r.get("video_id")]}
+        return {"video_ids": await repo.liked_video_ids(user_id, limit)}
+    except CircuitOpen:
+        raise
     except Exception as e:
         raise HTTPException(500, f"failed to load likes: {e}")
 
+# Liked videos, already hydrated, most recently liked first
+@app.get("/users/{user_id}/liked_videos")
+@cache.route(
+    CACHE_TTLS["likes"],
+    "liked_videos:{user_id}:{limit}:{cursor}",
+    tags=["likes:{user_id}"],
+    value_tags=lambda r: [f"video:{v['id']}" for v in r["videos"]],
+)
+async def user_liked_videos(user_id: str, limit: int = 60, cursor: str | None = None):
+    limit = max(1, min(limit, BATCH_MAX_IDS))
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(400, "invalid cursor")
+    try:
+        likes = await repo.user_likes(user_id, limit + 1, after)
+        next_cursor = None
+        if len(likes) > limit:
+            last = likes[limit - 1]
+            next_cursor = encode_cursor({"created_at": last["created_at"], "id": last["video_id"]})
+        return {"videos": await hydrate_videos([r["video_id"] for r in likes[:limit]]), "next_cursor": next_cursor}
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"failed to load liked videos: {e}")
+
 # Comment
 @app.post("/videos/{video_id}/comments")
-def add_comment(video_id: str, user_id: str, text: str):
+async def add_comment(video_id: str, user_id: str, text: str):
     if not (video_id and user_id and (text or '').strip()):
         raise HTTPException(400, "missing video_id, user_id, or text")
     try:
-        user = sb.table("users").select("username").eq("id", user_id).single().execute().data
-        username = user["username"] if user else None
-        res = (
-            sb.table("comments")
-            .insert({"video_id": video_id, "user_id": user_id, "username": username, "text": text})
-            .execute()
-        )
-        data = getattr(res, 'data', None) or []
-        row = data[0] if data else {"video_id": video_id, "user_id": user_id, "text": text, "username": username}
-        cc = (
-            sb.table("comments").select("*", count="exact").eq("video_id", video_id).execute().count
-            or 0
+        if not counters:
+            row, cc = await repo.add_comment(video_id, user_id, text)
+            cache.invalidate(f"video:{video_id}")
+            live.publish(video_id, comment_count=cc, comments=[row])
+            return {"comment": row, "comment_count": cc}
+        username = await repo.get_username(user_id)
+        row = (
+            await repo.insert_comment({"video_id": video_id, "user_id": user_id, "username": username, "text": text})
+            or {"video_id": video_id, "user_id": user_id, "text": text, "username": username}
         )
-        sb.table("videos").update({"comment_count": cc}).eq("id", video_id).execute()
+        _, cc = await counters.add(video_id, comments=1)
+        cache.invalidate(f"video:{video_id}")
+        live.publish(video_id, comment_count=cc, comments=[row])
         return {"comment": row, "comment_count": cc}
+    except CircuitOpen:
+        raise
     except Exception as e:
         raise HTTPException(500, f"failed to insert comment: {e}")
 
 
 # User profile videos
 @app.get("/users/{user_id}/videos")
-def user_videos(user_id: str, limit: int = 20, cursor: str | None = None):
-    q = sb.table("videos").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(limit)
-    if cursor:
-        q = q.lt("created_at", cursor)
-    return {"videos": q.execute().data}
+@cache.route(CACHE_TTLS["user_videos"], "user_videos:{user_id}:{limit}:{cursor}", tags=["user_videos:{user_id}"])
+async def user_videos(user_id: str, limit: int = 20, cursor: str | None = None):
+    return {"videos": await repo.user_videos(user_id, limit, cursor)}
 
 # Upload image to S3
 @app.post("/images/upload")
 async def upload_image(
     user_id: str = Form(...),
     file: UploadFile = File(...),
+    caption: str | None = Form(None),
 ):
     img_id = str(uuid4())
     key = f"images/{user_id}/{img_id}_{file.filename}"
@@ -197,8 +517,11 @@ async def upload_image(
             file.file.seek(0)
         except Exception:
             pass
-        s3.upload_fileobj(file.file, BUCKET, key, ExtraArgs={"ContentType": file.content_type})
-        url = f"https://{BUCKET}.s3.amazonaws.com/{key}"
+        await s3_call(
+            s3.upload_fileobj, file.file, BUCKET, key,
+            ExtraArgs={"ContentType": file.content_type}, deadline=S3_UPLOAD_DEADLINE, attempts=1,
+        )
+        url = object_url(key)
         row = {
             "id": img_id,
             "user_id": user_id,
@@ -206,130 +529,202 @@ async def upload_image(
             "url": url,
             "mime_type": file.content_type,
         }
-        sb.table("images").insert(row).execute()
+        if caption:
+            row["caption"] = caption
+        await repo.insert_image(row)
+        cache.invalidate(f"images:{user_id}")
         return {"image": row}
+    except CircuitOpen:
+        raise
     except Exception as e:
         raise HTTPException(500, f"image upload failed: {e}")
 
 
+# Thumbnails: GET /images/{id}/thumb redirects to a resized copy in S3,
+# rendered on first request and then shared by every client
+THUMB_WIDTH = int(os.getenv("THUMB_WIDTH", "256"))  # what list/search link to
+THUMB_TTL = 24 * 3600  # image -> variant URL mapping; the variant itself never changes
+THUMB_MAX_SOURCE = int(os.getenv("THUMB_MAX_SOURCE", str(40 * 1024 * 1024)))
+API_PUBLIC_URL = os.getenv("API_PUBLIC_URL", "")  # empty: thumb_url is relative to the API
+thumb_slots = asyncio.Semaphore(int(os.getenv("THUMB_CONCURRENCY", "4")))  # resizes at once
+
+def with_thumbs(rows):
+    for r in rows:
+        r["thumb_url"] = f"{API_PUBLIC_URL}/images/{r['id']}/thumb?w={THUMB_WIDTH}&fmt=webp"
+    return rows
+
+async def make_thumb(image, width, fmt):
+    src = image["storage_path"]
+    head = await s3_call(s3.head_object, Bucket=BUCKET, Key=src)
+    if head["ContentLength"] > THUMB_MAX_SOURCE:
+        return object_url(src)
+    key = variant_key(head["ETag"].strip('"'), width, fmt)
+    try:
+        # same bytes already rendered (another worker, or a duplicate upload)
+        await s3_call(s3.head_object, Bucket=BUCKET, Key=key)
+        return object_url(key)
+    except Exception:
+        pass
+    async with thumb_slots:
+        data = await s3_call(read_object, src)
+        try:
+            out = await asyncio.to_thread(render, data, width, fmt)
+        except Exception:
+            # no Pillow, or a format it can't decode: send the original
+            return object_url(src)
+    await s3_call(
+        s3.put_object,
+        Bucket=BUCKET,
+        Key=key,
+        Body=out,
+        ContentType=FORMATS[fmt][1],
+        CacheControl="public, max-age=31536000, immutable",
+    )
+    return object_url(key)
+
+@app.get("/images/{image_id}/thumb")
+async def thumbnail(image_id: str, w: int = THUMB_WIDTH, fmt: Literal["webp", "avif", "jpeg"] = "webp"):
+    width = snap_width(max(1, w))
+
+    async def fetch():
+        image = await repo.get_image(image_id)
+        return await make_thumb(image, width, fmt) if image and image.get("storage_path") else None
+
+    try:
+        url = await cache.get_or_fetch(f"thumb:{image_id}:{width}:{fmt}", THUMB_TTL, fetch, [f"image:{image_id}"])
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"failed to make thumbnail: {e}")
+    if not url:
+        raise HTTPException(404, "image not found")
+    return RedirectResponse(url, 302, headers={"Cache-Control": f"public, max-age={THUMB_TTL}"})
+
 # List images for a user
 @app.get("/images")
-def list_images(user_id: str, limit: int = 60, cursor: str | None = None):
+@cache.route(CACHE_TTLS["images"], "images:{user_id}:{limit}:{cursor}", tags=["images:{user_id}"])
+async def list_images(user_id: str, limit: int = 60, cursor: str | None = None):
     try:
-        q = (
-            sb.table("images")
-            .select("*")
-            .eq("user_id", user_id)
-            .order("created_at", desc=True)
-            .limit(limit)
-        )
-        if cursor:
-            q = q.lt("created_at", cursor)
-        data = q.execute().data or []
-        return {"images": data}
+        return {"images": with_thumbs(await repo.list_images(user_id, limit, cursor))}
+    except CircuitOpen:
+        raise
     except Exception as e:
         raise HTTPException(500, f"failed to list images: {e}")
 
-# Search images by keywords
+# Search images by keywords (filename, caption, prompt), best matches first
+SEARCH_MAX_PAGE = 100
+
 @app.get("/images/search")
-def search_images(user_id: str, q: str, limit: int = 60):
+@cache.route(CACHE_TTLS["images"], "search:{user_id}:{q}:{limit}:{offset}", tags=["images:{user_id}"])
+async def search_images(user_id: str, q: str, limit: int = 60, offset: int = 0):
     try:
-        tokens = [t for t in re.split(r"[^A-Za-z0-9]+", q.lower()) if t]
+        tokens = [t for t in re.split(r"[^A-Za-z0-9]+", q.lower()) if t][:16]
         if not tokens:
-            return {"images": []}
-        
-        or_clauses = []
-        for t in tokens:
-            or_clauses.append(f"storage_path.ilike.%{t}%")
-            or_clauses.append(f"url.ilike.%{t}%")
-        or_filter = ",".join(or_clauses)
-        qry = (
-            sb.table("images")
-            .select("*")
-            .eq("user_id", user_id)
-            .or_(or_filter)
-            .order("created_at", desc=True)
-            .limit(limit)
-        )
-        data = qry.execute().data or []
-        return {"images": data}
+            return {"images": [], "next_offset": None}
+        limit = max(1, min(limit, SEARCH_MAX_PAGE))
+        offset = max(0, offset)
+        rows = await repo.search_images(user_id, tokens, limit, offset)
+        return {"images": with_thumbs(rows), "next_offset": offset + limit if len(rows) == limit else None}
+    except CircuitOpen:
+        raise
     except Exception as e:
         raise HTTPException(500, f"failed to search images: {e}")
 
 @app.delete("/images/{image_id}")
-def delete_image(image_id: str, user_id: str):
+async def delete_image(image_id: str, user_id: str):
     try:
-        row = (
-            sb.table("images").select("id,storage_path,user_id").eq("id", image_id).single().execute().data
-        )
+        row = await repo.get_image(image_id)
         if not row or row.get("user_id") != user_id:
             raise HTTPException(404, "image not found")
         key = row.get("storage_path")
         if key:
             try:
-                s3.delete_object(Bucket=BUCKET, Key=key)
+                await s3_call(s3.delete_object, Bucket=BUCKET, Key=key)
             except Exception:
                 pass
-        sb.table("images").delete().eq("id", image_id).execute()
+        await repo.delete_image(image_id)
+        cache.invalidate(f"images:{user_id}", f"image:{image_id}")
         return {"ok": True}
     except HTTPException:
         raise
+    except CircuitOpen:
+        raise
     except Exception as e:
         raise HTTPException(500, f"failed to delete image: {e}")
 
-# User profile summary
-@app.get("/users/{user_id}")
-def user_profile(user_id: str):
+# AI image generation: jobs run on a small worker pool, never inside the request
+class GenerateRequest(BaseModel):
+    user_id: str
+    prompt: str
+
+async def store_generated(job, data, content_type):
+    img_id = str(uuid4())
+    key = f"images/{job['user_id']}/{img_id}_generated.png"
+    await s3_call(s3.put_object, Bucket=BUCKET, Key=key, Body=data, ContentType=content_type)
+    row = {
+        "id": img_id,
+        "user_id": job["user_id"],
+        "storage_path": key,
+        "url": object_url(key),
+        "mime_type": content_type,
+        "prompt": job["prompt"],
+    }
     try:
-        u = (
-            sb.table("users")
-            .select("id, username, avatar_url, aura") 
-            .eq("id", user_id)
-            .single()
-            .execute()
-            .data
-        )
+        await repo.insert_image(row)
     except Exception:
-        try:
-            u = (
-                sb.table("users")
-                .select("id, username, avatar_url")
-                .eq("id", user_id)
-                .single()
-                .execute()
-                .data
-            )
-        except Exception:
-            raise HTTPException(404, "user not found")
+        await s3_call(s3.delete_object, Bucket=BUCKET, Key=key)
+        raise
+    cache.invalidate(f"images:{job['user_id']}")
+    return row
+
+# GEN_PROVIDER=openai (default) | fake (local solid-colour PNGs, no API key)
+generator = GenerationQueue(
+    make_provider(),
+    store_generated,
+    repo.save_generation_job,
+    repo.get_generation_job,
+    workers=int(os.getenv("GEN_WORKERS", "2")),
+    max_pending=int(os.getenv("GEN_MAX_PENDING", "100")),
+    max_per_user=int(os.getenv("GEN_MAX_PER_USER", "3")),
+    timeout=float(os.getenv("GEN_TIMEOUT", "120")),
+)
 
-    if not u:
-        raise HTTPException(404, "user not found")
+def job_view(job):
+    return {k: job[k] for k in ("id", "user_id", "prompt", "status", "image", "error")}
 
+@app.post("/generate", status_code=202)
+async def generate(body: GenerateRequest):
+    prompt = body.prompt.strip()
+    if not (body.user_id and prompt):
+        raise HTTPException(400, "missing user_id or prompt")
     try:
-        posts = (
-            sb.table("videos").select("*", count="exact").eq("user_id", user_id).execute().count
-            or 0
-        )
-    except Exception:
-        posts = 0
+        job = await generator.submit(body.user_id, prompt[:4000])
+    except QueueFull as e:
+        raise HTTPException(429, str(e))
+    return job_view(job)
+
+@app.get("/generate/{job_id}")
+async def generation_status(job_id: str):
+    job = await generator.get(job_id)
+    if not job:
+        raise HTTPException(404, "job not found")
+    return job_view(job)
 
-    # followers/following counts
-    followers = 0
-    following = 0
-    try:
-        followers = (
-            sb.table("follows").select("*", count="exact").eq("followed_id", user_id).execute().count
-            or 0
-        )
-    except Exception:
-        followers = 0
-    try:
-        following = (
-            sb.table("follows").select("*", count="exact").eq("follower_id", user_id).execute().count
-            or 0
+# User profile summary
+@app.get("/users/{user_id}")
+@cache.route(CACHE_TTLS["user"], "user:{user_id}", tags=["user:{user_id}"])
+async def user_profile(user_id: str):
+    # one query: follow counters are stored on the row (002_atomic_counters.sql)
+    u = await repo.get_user(user_id)
+    if not u:
+        raise HTTPException(404, "user not found")
+    if u.get("follower_count") is None:
+        # schema without the stored counters: count the rows instead
+        u["video_count"], u["follower_count"], u["following_count"] = await asyncio.gather(
+            fallback(repo.count_user_videos(user_id), 0),
+            fallback(repo.count_followers(user_id), 0),
+            fallback(repo.count_following(user_id), 0),
         )
-    except Exception:
-        following = 0
 
     return {
         "user": {
@@ -337,100 +732,268 @@ def user_profile(user_id: str):
             "username": u.get("username"),
             "avatar_url": u.get("avatar_url"),
             "aura": u.get("aura") or 0,
-            "posts": int(posts),
-            "followers": int(followers),
-            "following": int(following),
+            "posts": int(u.get("video_count") or 0),
+            "followers": int(u.get("follower_count") or 0),
+            "following": int(u.get("following_count") or 0),
         }
     }
 
 @app.get("/users/{target_id}/is_following")
-def is_following(target_id: str, follower_id: str):
+async def is_following(target_id: str, follower_id: str):
     try:
-        rows = (
-            sb.table("follows")
-            .select("follower_id")
-            .eq("follower_id", follower_id)
-            .eq("followed_id", target_id)
-            .limit(1)
-            .execute()
-            .data or []
-        )
-        print("IS_FOLLOWING ROWS", rows)
-        return {"is_following": len(rows) > 0}
+        following = await repo.is_following(follower_id, target_id)
+        return {"is_following": following}
+    except CircuitOpen:
+        raise
     except Exception as e:
         return {"is_following": False, "warning": f"{e}"}
 
 @app.post("/users/{target_id}/follow")
-def follow_user(target_id: str, follower_id: str):
+async def follow_user(target_id: str, follower_id: str):
     if target_id == follower_id:
         raise HTTPException(400, "cannot follow self")
     try:
-        res = (
-            sb.table("follows")
-            .upsert({"follower_id": follower_id, "followed_id": target_id}, on_conflict="follower_id,followed_id")
-            .execute()
-        )
-        print("UPSERT FOLLOW RESP", getattr(res, "data", None), getattr(res, "status_code", None))
+        followers = await repo.follow(follower_id, target_id)
+    except CircuitOpen:
+        raise
     except Exception as e:
-        print("UPSERT FOLLOW ERROR", repr(e))
-        try:
-            res2 = sb.table("follows").insert({"follower_id": follower_id, "followed_id": target_id}).execute()
-            print("INSERT FOLLOW RESP", getattr(res2, "data", None), getattr(res2, "status_code", None))
-        except Exception as e2:
-            print("INSERT FOLLOW ERROR", repr(e2))
-            raise HTTPException(500, f"failed to write follows: {e2}")
-
-    followers = 0
-    last_err = None
-    for _ in range(3):
-        try:
-            followers = (
-                sb.table("follows")
-                .select("*", count="exact")
-                .eq("followed_id", target_id)
-                .execute()
-                .count or 0
-            )
-            break
-        except Exception as e:
-            last_err = e
-            time.sleep(0.08)
+        log.error("follow failed", extra={"target": target_id, "follower": follower_id}, exc_info=True)
+        raise HTTPException(500, f"failed to write follows: {e}")
 
-    print("FOLLOW POST", {"target": target_id, "follower": follower_id})
-    print("FOLLOW COUNT", {"followers": followers, "err": str(last_err) if last_err else None})
+    await fallback(repo.backfill_timeline(follower_id, target_id, TIMELINE_BACKFILL, FANOUT_MAX_FOLLOWERS), 0)
+    cache.invalidate(f"user:{target_id}", f"user:{follower_id}", f"for_you:{follower_id}")
+    log.debug("follow", extra={"target": target_id, "follower": follower_id, "followers": followers})
     return {"followers": int(followers)}
 
 @app.delete("/users/{target_id}/follow")
-def unfollow_user(target_id: str, follower_id: str):
+async def unfollow_user(target_id: str, follower_id: str):
     if target_id == follower_id:
         raise HTTPException(400, "cannot unfollow self")
     try:
-        dres = sb.table("follows").delete().eq("follower_id", follower_id).eq("followed_id", target_id).execute()
-        print("DELETE FOLLOW RESP", getattr(dres, "data", None), getattr(dres, "status_code", None))
+        followers = await repo.unfollow(follower_id, target_id)
+    except CircuitOpen:
+        raise
     except Exception as e:
-        print("DELETE FOLLOW ERROR", repr(e))
+        log.error("unfollow failed", extra={"target": target_id, "follower": follower_id}, exc_info=True)
         raise HTTPException(500, f"failed to delete follows: {e}")
 
-    followers = 0
-    last_err = None
-    for _ in range(3):
+    await fallback(repo.prune_timeline(follower_id, target_id), None)
+    cache.invalidate(f"user:{target_id}", f"user:{follower_id}", f"for_you:{follower_id}")
+    log.debug("unfollow", extra={"target": target_id, "follower": follower_id, "followers": followers})
+    return {"followers": int(followers)}
+
+# Batched social actions (offline queue, rapid taps): reduced to their net
+# effect, written with one bulk statement per kind, counters moved once per
+# video and per user. Results line up with the submitted actions.
+BATCH_MAX_ACTIONS = int(os.getenv("BATCH_MAX_ACTIONS", "500"))
+
+class Action(BaseModel):
+    type: Literal["like", "unlike", "comment", "follow", "unfollow"]
+    video_id: str | None = None  # like/unlike/comment
+    target_id: str | None = None  # follow/unfollow
+    text: str | None = None  # comment
+    client_id: str | None = None  # idempotency key from the client's queue
+
+class ActionBatch(BaseModel):
+    user_id: str
+    actions: list[Action]
+
+async def bulk(fn, items):
+    # -> (what fn returned, {position in items: error}). One statement for the
+    # lot; if that fails, row by row so one bad action doesn't sink the rest
+    if not items:
+        return [], {}
+    try:
+        return await fn(items), {}
+    except CircuitOpen:
+        raise
+    except Exception as e:
+        if len(items) == 1:
+            return [], {0: e}
+    out = await asyncio.gather(*(fn([x]) for x in items), return_exceptions=True)
+    return (
+        [r for o in out if not isinstance(o, Exception) for r in o],
+        {k: o for k, o in enumerate(out) if isinstance(o, Exception)},
+    )
+
+@app.post("/actions/batch")
+async def actions_batch(body: ActionBatch):
+    if len(body.actions) > BATCH_MAX_ACTIONS:
+        raise HTTPException(400, f"at most {BATCH_MAX_ACTIONS} actions per batch")
+    user_id, actions = body.user_id, body.actions
+    plan = collapse(user_id, actions)
+    like_on = [v for v, (_, on) in plan.likes.items() if on]
+    like_off = [v for v, (_, on) in plan.likes.items() if not on]
+    follow_on = [t for t, (_, on) in plan.follows.items() if on]
+    follow_off = [t for t, (_, on) in plan.follows.items() if not on]
+    username = await fallback(repo.get_username(user_id), None) if plan.comments else None
+    comment_ids = {i: str(uuid4()) for i in plan.comments}
+    new_comments = [
+        {"id": comment_ids[i], "video_id": actions[i].video_id, "user_id": user_id, "username": username, "text": actions[i].text}
+        for i in plan.comments
+    ]
+
+    written = await asyncio.gather(
+        bulk(lambda vs: repo.add_likes(user_id, vs), like_on),
+        bulk(lambda vs: repo.remove_likes(user_id, vs), like_off),
+        bulk(repo.insert_comments, new_comments),
+        bulk(lambda ts: repo.add_follows(user_id, ts), follow_on),
+        bulk(lambda ts: repo.remove_follows(user_id, ts), follow_off),
+    )
+    groups = [
+        [plan.likes[v][0] for v in like_on], [plan.likes[v][0] for v in like_off], plan.comments,
+        [plan.follows[t][0] for t in follow_on], [plan.follows[t][0] for t in follow_off],
+    ]
+    failed = {}  # action index -> error
+    for (_, errors), indexes in zip(written, groups):
+        for k, e in errors.items():
+            log.warning("batch action failed", extra={"user": user_id, "action": indexes[k], "error": str(e)})
+            failed[indexes[k]] = str(e)
+    liked, unliked, comments, followed, unfollowed = [changed for changed, _ in written]
+
+    # only rows that actually changed move a counter
+    video_deltas, user_deltas = {}, {}
+    for vid, dl, dc in [(v, 1, 0) for v in liked] + [(v, -1, 0) for v in unliked] + [(c["video_id"], 0, 1) for c in comments]:
+        d = video_deltas.setdefault(vid, [0, 0])
+        d[0] += dl
+        d[1] += dc
+    for t, n in [(t, 1) for t in followed] + [(t, -1) for t in unfollowed]:
+        user_deltas.setdefault(t, [0, 0])[0] += n
+    if followed or unfollowed:
+        user_deltas.setdefault(user_id, [0, 0])[1] += len(followed) - len(unfollowed)
+
+    video_counts, user_counts = {}, {}
+    try:
+        if counters:
+            video_counts = await counters.add_many({v: tuple(d) for v, d in video_deltas.items()})
+        elif video_deltas:
+            video_counts = await repo.bump_video_counts({v: tuple(d) for v, d in video_deltas.items()})
+        if user_deltas:
+            user_counts = await repo.bump_user_counts({u: tuple(d) for u, d in user_deltas.items()})
+    except Exception:
+        # the rows are written; a recount repairs the counters
+        log.error("batch counter update failed", extra={"user": user_id}, exc_info=True)
+
+    # a no-op like/unfollow moved no counter; answer with the current one like the single routes do
+    stale_videos = [v for v in {*plan.likes, *video_deltas} if v not in video_counts]
+    stale_users = [t for t in plan.follows if t not in user_counts]
+    if stale_videos:
+        # with write-behind, the stored counter plus what is still pending
+        read = counters.add_many(dict.fromkeys(stale_videos, (0, 0))) if counters else repo.video_counts(stale_videos)
+        video_counts.update(await fallback(read, {}))
+    if stale_users:
+        user_counts.update(await fallback(repo.user_counts(stale_users), {}))
+
+    await asyncio.gather(
+        *(fallback(repo.backfill_timeline(user_id, t, TIMELINE_BACKFILL, FANOUT_MAX_FOLLOWERS), 0) for t in followed),
+        *(fallback(repo.prune_timeline(user_id, t), None) for t in unfollowed),
+    )
+    tags = [f"video:{v}" for v in video_deltas]
+    if liked or unliked:
+        tags.append(f"likes:{user_id}")
+    if followed or unfollowed:
+        tags += [f"user:{user_id}", f"for_you:{user_id}", *(f"user:{t}" for t in followed + unfollowed)]
+    cache.invalidate(*tags)
+
+    rows_by_video = {}
+    for c in comments:
+        rows_by_video.setdefault(c["video_id"], []).append(c)
+    for v in video_deltas:
+        lc, cc = video_counts.get(v) or (None, None)
+        delta = {"like_count": lc, "comment_count": cc} if lc is not None else {}
+        if v in rows_by_video:
+            delta["comments"] = rows_by_video[v]
+        if delta:
+            live.publish(v, **delta)
+
+    saved = {c["id"]: c for c in comments}
+    results = []
+    for i, a in enumerate(actions):
+        if i in plan.same_as:
+            results.append(None)  # filled in below
+            continue
+        if i in plan.errors:
+            results.append({"ok": False, "error": plan.errors[i]})
+            continue
+        if a.type == "comment":
+            j = i
+        else:
+            j, on = plan.likes[a.video_id] if a.type in ("like", "unlike") else plan.follows[a.target_id]
+        if j in failed:
+            results.append({"ok": False, "error": failed[j]})
+        elif a.type == "comment":
+            cc = (video_counts.get(a.video_id) or (None, None))[1]
+            results.append({"ok": True, "comment": saved.get(comment_ids[i]), "comment_count": cc})
+        elif a.type in ("like", "unlike"):
+            lc = (video_counts.get(a.video_id) or (None, None))[0]
+            results.append({"ok": True, "superseded": i != j, "liked": on, "like_count": lc})
+        else:
+            followers = (user_counts.get(a.target_id) or (None, None))[0]
+            results.append({"ok": True, "superseded": i != j, "following": on, "followers": followers})
+    for i, j in plan.same_as.items():
+        results[i] = results[j]
+    return {"results": results}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return cache.stats()
+
+@app.get("/clients/stats")
+async def client_stats():
+    db = getattr(repo, "policy", None)  # SqliteRepo makes no network calls
+    return {"database": db.stats() if db else None, "storage": storage.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    policies = [p for p in (getattr(repo, "policy", None), storage) if p]
+    c = cache.stats()
+    extra = [
+        *collected("upstream_circuit_open", "1 while the breaker rejects calls.", "gauge",
+                   [({"upstream": p.name}, int(p.breaker.state == "open")) for p in policies]),
+        *collected("upstream_retries_total", "Upstream retries.", "counter",
+                   [({"upstream": p.name}, p.retries) for p in policies]),
+        *collected("upstream_rejected_total", "Calls rejected by an open breaker.", "counter",
+                   [({"upstream": p.name}, p.rejected) for p in policies]),
+        *collected("cache_requests_total", "Response cache lookups.", "counter",
+                   [({"result": k}, c[k]) for k in ("hits", "misses", "coalesced")]),
+        *collected("cache_entries", "Response cache size.", "gauge", [({}, c["entries"])]),
+    ]
+    return PlainTextResponse(render_metrics(extra), media_type="text/plain; version=0.0.4")
+
+# /health is liveness: the process answers. /ready is readiness: started,
+# not draining, and its dependencies usable, so a load balancer only sends
+# traffic to workers that can serve it.
+READY_CHECK_TTL = float(os.getenv("READY_CHECK_TTL", "2"))
+lifecycle = {"started": False, "draining": False, "db_checked": 0.0, "db_error": "not checked"}
+
+def start_draining():
+    # from serve.py on SIGTERM, before the server stops accepting
+    lifecycle["draining"] = True
+
+async def database_error():
+    # at most one ping per READY_CHECK_TTL, however often probes arrive
+    now = time.monotonic()
+    if now - lifecycle["db_checked"] >= READY_CHECK_TTL:
+        lifecycle["db_checked"] = now
         try:
-            followers = (
-                sb.table("follows")
-                .select("*", count="exact")
-                .eq("followed_id", target_id)
-                .execute()
-                .count or 0
-            )
-            break
+            await asyncio.wait_for(repo.ping(), 2.0)
+            lifecycle["db_error"] = None
         except Exception as e:
-            last_err = e
-            time.sleep(0.08)
-
-    print("FOLLOW DELETE", {"target": target_id, "follower": follower_id})
-    print("FOLLOW COUNT", {"followers": followers, "err": str(last_err) if last_err else None})
-    return {"followers": int(followers)}
+            lifecycle["db_error"] = str(e) or type(e).__name__
+    return lifecycle["db_error"]
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    checks = {
+        "started": lifecycle["started"],
+        "draining": lifecycle["draining"],
+        "database": (await database_error() if lifecycle["started"] else "not started") or "ok",
+        "storage": storage.breaker.state,
+    }
+    ok = checks["started"] and not checks["draining"] and checks["database"] == "ok" and checks["storage"] != "open"
+    body = {"status": "ready" if ok else "not_ready", "worker": os.getpid(), "checks": checks}
+    return JSONResponse(body, 200 if ok else 503)
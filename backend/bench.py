@@ -0,0 +1,156 @@
+"""Offline load test for the API.
+
+Seeds the SQLite repo with deterministic data and drives `app` in-process
+through an ASGI client, reporting p50/p99 latency and req/s per endpoint.
+
+    python backend/bench.py --requests 300 --concurrency 16
+    python backend/bench.py --save bench.json
+    python backend/bench.py --compare bench.json --tolerance 0.25
+
+The response cache is off unless CACHE_BACKEND is set: every scenario
+repeats a handful of keys, so with it on the numbers would be cache hits
+and --compare could not catch a slower query.
+
+    CACHE_BACKEND=memory python backend/bench.py
+"""
+import argparse, asyncio, json, os, random, sys, time
+from datetime import datetime, timedelta, timezone
+
+os.environ["DATA_BACKEND"] = "sqlite"
+os.environ.setdefault("SQLITE_PATH", ":memory:")
+os.environ.setdefault("CACHE_BACKEND", "off")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from app import app, repo
+
+
+def seed(repo, users=50, videos=500, likes=5000, comments=2000, follows=600, images=300, rnd_seed=7):
+    rnd = random.Random(rnd_seed)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    ts = lambda i: (base + timedelta(seconds=i)).isoformat()
+    user_ids = [f"u{i}" for i in range(users)]
+    repo.insert_rows("users", [{"id": u, "username": f"user{i}", "aura": i, "created_at": ts(i)} for i, u in enumerate(user_ids)])
+
+    video_ids = [f"v{i}" for i in range(videos)]
+    repo.insert_rows("videos", [
+        {"id": v, "user_id": rnd.choice(user_ids), "s3_key": f"uploads/x/{v}.mp4",
+         "url": f"https://bench.invalid/{v}.mp4", "caption": f"clip {i}", "created_at": ts(i)}
+        for i, v in enumerate(video_ids)
+    ])
+
+    like_pairs = {(rnd.choice(video_ids), rnd.choice(user_ids)) for _ in range(likes)}
+    repo.insert_rows("likes", [{"video_id": v, "user_id": u} for v, u in like_pairs])
+    repo.insert_rows("comments", [
+        {"id": f"c{i}", "video_id": rnd.choice(video_ids), "user_id": u, "username": u, "text": f"nice {i}", "created_at": ts(i)}
+        for i, u in ((i, rnd.choice(user_ids)) for i in range(comments))
+    ])
+    follow_pairs = {(a, b) for a, b in ((rnd.choice(user_ids), rnd.choice(user_ids)) for _ in range(follows)) if a != b}
+    repo.insert_rows("follows", [{"follower_id": a, "followed_id": b} for a, b in follow_pairs])
+    repo.insert_rows("images", [
+        {"id": f"i{i}", "user_id": user_ids[i % 5], "storage_path": f"images/{user_ids[i % 5]}/i{i}_{rnd.choice(['cat', 'otter', 'beach', 'city'])}.png",
+         "url": f"https://bench.invalid/i{i}.png", "mime_type": "image/png", "created_at": ts(i)}
+        for i in range(images)
+    ])
+
+    # counters as the write paths would have left them
+    repo.recount()
+    repo.rebuild_timelines()
+    return user_ids, video_ids
+
+
+def scenarios(user_ids, video_ids):
+    rnd = random.Random(11)
+    u = lambda: rnd.choice(user_ids)
+    v = lambda: rnd.choice(video_ids)
+    return {
+        "GET /videos": lambda: ("GET", "/videos", {"limit": 20}),
+        "GET /feed/{user_id}": lambda: ("GET", f"/feed/{u()}", {"limit": 20}),
+        "GET /videos/{id}": lambda: ("GET", f"/videos/{v()}", {}),
+        "GET /users/{id}": lambda: ("GET", f"/users/{u()}", {}),
+        "GET /users/{id}/likes": lambda: ("GET", f"/users/{u()}/likes", {}),
+        "GET /users/{id}/videos": lambda: ("GET", f"/users/{u()}/videos", {}),
+        "POST like": lambda: ("POST", f"/videos/{v()}/like", {"user_id": u()}),
+        "DELETE like": lambda: ("DELETE", f"/videos/{v()}/like", {"user_id": u()}),
+        "POST comment": lambda: ("POST", f"/videos/{v()}/comments", {"user_id": u(), "text": "bench"}),
+        "POST follow": lambda: ("POST", f"/users/{user_ids[0]}/follow", {"follower_id": rnd.choice(user_ids[1:])}),
+        "DELETE follow": lambda: ("DELETE", f"/users/{user_ids[0]}/follow", {"follower_id": rnd.choice(user_ids[1:])}),
+        "GET /images": lambda: ("GET", "/images", {"user_id": user_ids[rnd.randrange(5)]}),
+        "GET /images/search": lambda: ("GET", "/images/search", {"user_id": user_ids[rnd.randrange(5)], "q": "cat otter"}),
+    }
+
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))]
+
+
+async def run_one(client, make, n, concurrency):
+    lat, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def hit():
+        nonlocal errors
+        method, path, params = make()
+        async with sem:
+            t0 = time.perf_counter()
+            r = await client.request(method, path, params=params)
+            lat.append(time.perf_counter() - t0)
+        if r.status_code >= 400:
+            errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(hit() for _ in range(n)))
+    wall = time.perf_counter() - t0
+    return {
+        "p50_ms": pct(lat, 50) * 1000,
+        "p99_ms": pct(lat, 99) * 1000,
+        "rps": n / wall,
+        "errors": errors,
+    }
+
+
+async def main(args):
+    user_ids, video_ids = seed(repo, users=args.users, videos=args.videos)
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, make in scenarios(user_ids, video_ids).items():
+            if args.only and args.only not in name:
+                continue
+            await run_one(client, make, min(20, args.requests), args.concurrency)  # warm up
+            results[name] = await run_one(client, make, args.requests, args.concurrency)
+
+    print(f"cache: {os.environ['CACHE_BACKEND']}")
+    print(f"{'endpoint':<24}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    for name, r in results.items():
+        print(f"{name:<24}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['rps']:>10.0f}{r['errors']:>8}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = [
+            name for name, r in results.items()
+            if name in baseline and r["p50_ms"] > baseline[name]["p50_ms"] * (1 + args.tolerance)
+        ]
+        for name in regressed:
+            print(f"REGRESSION {name}: p50 {baseline[name]['p50_ms']:.2f}ms -> {results[name]['p50_ms']:.2f}ms")
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--users", type=int, default=50)
+    p.add_argument("--videos", type=int, default=500)
+    p.add_argument("--only", help="run endpoints whose name contains this")
+    p.add_argument("--save", help="write results as JSON")
+    p.add_argument("--compare", help="baseline JSON from --save; exit 1 on p50 regression")
+    p.add_argument("--tolerance", type=float, default=0.25)
+    sys.exit(asyncio.run(main(p.parse_args())))
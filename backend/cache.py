@@ -0,0 +1,186 @@
+import asyncio, functools, json, os, sqlite3, time
+from collections import OrderedDict
+
+# Read-through cache for hot GET responses. Entries carry tags ("video:<id>",
+# "user:<id>", ...) so write routes can drop everything a change touches.
+# Concurrent misses on the same key share one upstream fetch (single-flight).
+
+MISS = object()
+
+
+class MemoryBackend:
+    # in-process LRU; each worker has its own copy
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires, value, tags)
+        self.tags = {}  # tag -> set of keys
+
+    def get(self, key):
+        e = self.entries.get(key)
+        if e is None:
+            return MISS
+        if e[0] < time.monotonic():
+            self._drop(key)
+            return MISS
+        self.entries.move_to_end(key)
+        return e[1]
+
+    def set(self, key, value, ttl, tags):
+        self._drop(key)
+        self.entries[key] = (time.monotonic() + ttl, value, tags)
+        for t in tags:
+            self.tags.setdefault(t, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._drop(next(iter(self.entries)))
+
+    def invalidate(self, tags):
+        for t in tags:
+            for key in self.tags.pop(t, ()):
+                self._drop(key)
+
+    def _drop(self, key):
+        e = self.entries.pop(key, None)
+        if e:
+            for t in e[2]:
+                keys = self.tags.get(t)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del self.tags[t]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SqliteBackend:
+    # one file shared by every worker on the host, so invalidations are seen by all
+    def __init__(self, path, max_entries=50000):
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("pragma journal_mode = wal")
+        self.conn.execute("pragma synchronous = normal")
+        self.conn.executescript("""
+            create table if not exists cache (key text primary key, value text, expires real);
+            create table if not exists cache_tags (tag text, key text, primary key (tag, key));
+            create index if not exists cache_tags_key on cache_tags(key);
+        """)
+
+    def get(self, key):
+        row = self.conn.execute("select value, expires from cache where key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return MISS
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl, tags):
+        with self.conn:
+            self.conn.execute("begin")
+            self.conn.execute(
+                "insert or replace into cache (key, value, expires) values (?, ?, ?)",
+                (key, json.dumps(value, default=str), time.time() + ttl),
+            )
+            self.conn.execute("delete from cache_tags where key = ?", (key,))
+            self.conn.executemany("insert or ignore into cache_tags (tag, key) values (?, ?)", [(t, key) for t in tags])
+        if len(self) > self.max_entries:
+            self.conn.execute("delete from cache where expires < ?", (time.time(),))
+            self.conn.execute("delete from cache_tags where key not in (select key from cache)")
+
+    def invalidate(self, tags):
+        marks = ", ".join("?" for _ in tags)
+        with self.conn:
+            self.conn.execute("begin")
+            self.conn.execute(f"delete from cache where key in (select key from cache_tags where tag in ({marks}))", tags)
+            self.conn.execute(f"delete from cache_tags where tag in ({marks})", tags)
+
+    def __len__(self):
+        return self.conn.execute("select count(*) from cache").fetchone()[0]
+
+
+class LeaderCancelled(Exception):
+    # the request filling a key was cancelled before it finished
+    pass
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.inflight = {}  # key -> Future for a fetch already under way
+        self.epoch = 0  # bumped on every invalidation
+        self.hits = self.misses = self.coalesced = self.invalidations = 0
+
+    async def get_or_fetch(self, key, ttl, fetch, tags=(), value_tags=None):
+        if self.backend is None:
+            return await fetch()
+        value = self.backend.get(key)
+        if value is not MISS:
+            self.hits += 1
+            return value
+        fut = self.inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(fut)
+            except LeaderCancelled:
+                # the request doing the fetch went away; take the fill over
+                return await self.get_or_fetch(key, ttl, fetch, tags, value_tags)
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self.inflight[key] = fut
+        epoch = self.epoch
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            # only the leader was cancelled; its waiters retry instead
+            fut.set_exception(LeaderCancelled())
+            fut.exception()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # waiters re-raise it; don't warn if there are none
+            raise
+        finally:
+            self.inflight.pop(key, None)
+        # a write that landed mid-fetch may have made this value stale
+        if epoch == self.epoch:
+            self.backend.set(key, value, ttl, [*tags, *(value_tags(value) if value_tags else ())])
+        fut.set_result(value)
+        return value
+
+    def route(self, ttl, key, tags=(), value_tags=None):
+        # decorator for GET handlers; key and tags are format strings over the
+        # handler's parameters, e.g. key="video:{video_id}:{comments_limit}";
+        # value_tags(response) adds tags that depend on what was returned
+        def deco(fn):
+            @functools.wraps(fn)
+            async def wrapper(**kw):
+                return await self.get_or_fetch(
+                    key.format(**kw), ttl, lambda: fn(**kw), [t.format(**kw) for t in tags], value_tags
+                )
+            return wrapper
+        return deco
+
+    def invalidate(self, *tags):
+        if self.backend is None or not tags:
+            return
+        self.epoch += 1
+        self.invalidations += 1
+        self.backend.invalidate(list(tags))
+
+    def stats(self):
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "entries": len(self.backend) if self.backend else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+
+def make_cache():
+    kind = os.getenv("CACHE_BACKEND", "memory")
+    if kind == "off":
+        return ResponseCache(None)
+    if kind == "sqlite":
+        return ResponseCache(SqliteBackend(os.getenv("CACHE_PATH", "/tmp/giggles-cache.db")))
+    return ResponseCache(MemoryBackend(int(os.getenv("CACHE_MAX_ENTRIES", "5000"))))
@@ -0,0 +1,237 @@
+import asyncio, os, random, time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from postgrest.exceptions import APIError
+from botocore.exceptions import ClientError, HTTPClientError, ConnectionError as BotoConnectionError
+
+# Every outbound client is built here, so pool sizes, timeouts and retry
+# behaviour live in one place. Calls to Supabase and S3 go through a Policy:
+# a deadline per call, jittered exponential backoff, a retry budget shared by
+# all calls to that dependency, and a circuit breaker that fails fast while
+# it is down. Pool sizes are per worker process; size them to the number of
+# requests one worker has in flight.
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+S3_POOL_SIZE = int(os.getenv("S3_POOL_SIZE", "32"))
+
+
+def make_http_client(pool_size=HTTP_POOL_SIZE, timeout=5.0, http2=True):
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_SECONDS", "30")),
+        ),
+        # a short pool timeout: waiting for a free connection is a failure, not a queue
+        timeout=httpx.Timeout(timeout, connect=2.0, pool=1.0),
+        follow_redirects=True,
+    )
+
+
+def make_s3_client():
+    # imported here, so importing the app stays fast; boto3 alone takes ~0.2 s
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.getenv("AWS_REGION"),
+        endpoint_url=os.getenv("S3_ENDPOINT_URL"),  # e.g. a local moto/minio server
+        config=Config(
+            max_pool_connections=S3_POOL_SIZE,
+            connect_timeout=2,
+            read_timeout=int(os.getenv("S3_READ_TIMEOUT", "30")),
+            tcp_keepalive=True,
+            # retries happen in Policy only, so they count against its budget
+            retries={"max_attempts": 1, "mode": "standard"},
+        ),
+    )
+
+
+def make_executor():
+    # boto3 calls run via asyncio.to_thread; one thread per pooled S3 connection
+    # (plus a few for everything else) so threads never queue on the pool
+    return ThreadPoolExecutor(max_workers=S3_POOL_SIZE + 8, thread_name_prefix="io")
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class RetryBudget:
+    # token bucket: each call earns `ratio` of a retry, time adds `per_second`,
+    # so retries stay a bounded fraction of traffic during an outage
+    def __init__(self, ratio=0.2, per_second=1.0, cap=20.0):
+        self.ratio = ratio
+        self.per_second = per_second
+        self.cap = cap
+        self.tokens = cap
+        self.stamp = time.monotonic()
+
+    def deposit(self):
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def withdraw(self):
+        now = time.monotonic()
+        self.tokens = min(self.cap, self.tokens + (now - self.stamp) * self.per_second)
+        self.stamp = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    # opens after `threshold` transient failures in a row; after `cooldown`
+    # one trial call is let through and decides whether it closes again
+    def __init__(self, threshold=5, cooldown=10.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if self.probing or self.state == "open":
+            return False
+        self.probing = True
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def release(self):
+        # a cancelled trial call tells us nothing; let the next one try
+        self.probing = False
+
+
+# PostgREST could not reach or wait for Postgres, or Postgres is overloaded
+# or restarting (SQLSTATE classes 08 and 53, 57P0x, statement timeout)
+PGRST_TRANSIENT = ("PGRST000", "PGRST001", "PGRST002", "PGRST003", "08", "53", "57P0", "57014")
+
+
+def http_transient(e):
+    if isinstance(e, APIError):
+        # postgrest-py puts the HTTP status in `code` when the body is not PostgREST JSON (gateway 502/503/504)
+        code = str(e.code or "")
+        return (code.isdigit() and len(code) == 3 and code[0] == "5") or code.startswith(PGRST_TRANSIENT)
+    # asyncio.TimeoutError is only the builtin TimeoutError from 3.11 on
+    return isinstance(e, (httpx.TransportError, TimeoutError, asyncio.TimeoutError))
+
+
+def http_unsent(e):
+    # failed before the request went out, so even a write can be retried
+    return isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+def s3_transient(e):
+    if isinstance(e, ClientError):
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return status >= 500 or e.response.get("Error", {}).get("Code") in ("SlowDown", "Throttling", "RequestTimeout")
+    return isinstance(e, (BotoConnectionError, HTTPClientError, TimeoutError, asyncio.TimeoutError))
+
+
+def s3_unsent(e):
+    return isinstance(e, BotoConnectionError)
+
+
+class Policy:
+    def __init__(self, name, transient, unsent, attempts=3, deadline=5.0, base=0.05, cap=1.0, budget=None, breaker=None):
+        self.name = name
+        self.transient = transient
+        self.unsent = unsent
+        self.attempts = attempts
+        self.deadline = deadline
+        self.base = base
+        self.cap = cap
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.calls = self.retries = self.failures = self.rejected = 0
+
+    async def call(self, fn, idempotent=True, deadline=None, attempts=None):
+        # fn() makes a fresh awaitable per attempt
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpen(f"{self.name} unavailable")
+        self.calls += 1
+        self.budget.deposit()
+        end = time.monotonic() + (deadline or self.deadline)
+        attempt = 0
+        while True:
+            try:
+                result = await asyncio.wait_for(fn(), max(0.001, end - time.monotonic()))
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not self.transient(e):
+                    # the dependency answered; the error is about this request
+                    self.breaker.success()
+                    raise
+                self.failures += 1
+                self.breaker.failure()
+                attempt += 1
+                delay = random.uniform(0, min(self.cap, self.base * 2 ** attempt))  # full jitter
+                if (
+                    attempt >= (attempts or self.attempts)
+                    or not (idempotent or self.unsent(e))
+                    or self.breaker.opened_at is not None
+                    or time.monotonic() + delay >= end
+                    or not self.budget.withdraw()
+                ):
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.success()
+                return result
+
+    def stats(self):
+        return {
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "retry_tokens": round(self.budget.tokens, 2),
+        }
+
+
+def db_policy():
+    return Policy(
+        "database",
+        http_transient,
+        http_unsent,
+        attempts=int(os.getenv("DB_ATTEMPTS", "3")),
+        deadline=float(os.getenv("DB_DEADLINE", "5")),
+    )
+
+
+def s3_policy():
+    return Policy(
+        "storage",
+        s3_transient,
+        s3_unsent,
+        attempts=int(os.getenv("S3_ATTEMPTS", "3")),
+        deadline=float(os.getenv("S3_DEADLINE", "30")),
+    )
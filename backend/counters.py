@@ -0,0 +1,86 @@
+import asyncio
+from collections import OrderedDict
+from logs import get_logger
+
+# Write-behind counters (COUNTER_WRITE_BEHIND=1). Like/comment rows are still
+# written right away, but the videos.like_count/comment_count bumps are
+# summed per video and flushed together every `interval` seconds, so a burst
+# of likes on a hot video costs one counter update instead of one per tap.
+
+log = get_logger("counters")
+
+
+class CounterBuffer:
+    def __init__(self, repo, interval=1.0, max_known=10000, on_flush=None):
+        self.repo = repo
+        self.interval = interval
+        self.max_known = max_known
+        self.on_flush = on_flush  # called with {video_id: (like_count, comment_count)} after each flush
+        self.pending = {}  # video_id -> [likes, comments] not yet flushed
+        self.known = OrderedDict()  # video_id -> (like_count, comment_count) as of last flush or read
+        self.task = None
+
+    async def add(self, video_id, likes=0, comments=0):
+        # returns the best current estimate: (like_count, comment_count)
+        return (await self.add_many({video_id: (likes, comments)}))[video_id]
+
+    async def add_many(self, deltas):
+        # deltas: {video_id: (likes, comments)} -> {video_id: (like_count, comment_count)}
+        missing = [k for k in deltas if k not in self.known]
+        if missing:
+            # not flushed by this worker yet: start from the stored counters
+            stored = await self.repo.video_counts(missing)
+            for k in missing:
+                # a flush that landed while we were reading is at least as new
+                self.known.setdefault(k, stored.get(k, (0, 0)))
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._run())
+        out = {}
+        for k, (likes, comments) in deltas.items():
+            d = self.pending.setdefault(k, [0, 0])
+            d[0] += likes
+            d[1] += comments
+            base = self.known[k]
+            out[k] = (max(base[0] + d[0], 0), max(base[1] + d[1], 0))
+        self._trim()
+        return out
+
+    def _trim(self):
+        while len(self.known) > self.max_known:
+            self.known.popitem(last=False)
+
+    async def flush(self):
+        batch, self.pending = self.pending, {}
+        batch = {k: tuple(v) for k, v in batch.items() if v != [0, 0]}
+        if not batch:
+            return {}
+        try:
+            new = await self.repo.bump_video_counts(batch)
+        except Exception:
+            # keep the deltas for the next round
+            for k, (l, c) in batch.items():
+                d = self.pending.setdefault(k, [0, 0])
+                d[0] += l
+                d[1] += c
+            raise
+        for k, counts in new.items():
+            self.known[k] = counts
+            self.known.move_to_end(k)
+        self._trim()
+        if self.on_flush:
+            self.on_flush(new)
+        return new
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.warning("counter flush failed", exc_info=True)
@@ -0,0 +1,123 @@
+import asyncio, base64, json, math, re, zlib
+from datetime import datetime
+from repo import ROW_ID, check_keyset
+
+# "For You" pages. Two precomputed streams are interleaved:
+#   following - the user's timeline (filled on upload by repo.fanout_video),
+#               plus videos of followed creators too big to fan out, read here
+#   trending  - videos by trending_score (kept current by a DB trigger), minus
+#               the user's timeline and followed creators, so the two never overlap
+# Both are read by keyset, so a page costs a few index range scans of about
+# `limit` rows no matter how large the tables are. Trending scores move while
+# the user scrolls, so a video can sink below the trending keyset after it was
+# served; the cursor carries short hashes of the last TRENDING_SERVED_MAX
+# trending videos served and those are skipped.
+
+TRENDING_SERVED_MAX = 200
+SERVED = re.compile(r"(?:[0-9a-f]{8})*")
+
+
+def served_key(vid):
+    return f"{zlib.crc32(vid.encode()):08x}"
+
+
+def encode_feed_cursor(state):
+    raw = json.dumps(state, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_feed_cursor(token):
+    # {"f": [created_at, id] | null, "t": [score, id] | null, "fd": bool, "td": bool,
+    #  "s": served trending hashes, 8 hex chars each}
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        f, t = state.get("f"), state.get("t")
+        if f is not None:
+            created_at, vid = f
+            state["f"] = check_keyset(created_at, vid)
+        if t is not None:
+            score, vid = t
+            if isinstance(score, bool) or not isinstance(score, (int, float)) or not isinstance(vid, str):
+                raise ValueError
+            if not math.isfinite(score) or not ROW_ID.fullmatch(vid):
+                raise ValueError
+            state["t"] = (float(score), vid)
+        if not all(isinstance(state.get(k, False), bool) for k in ("fd", "td")):
+            raise ValueError
+        served = state.get("s", "")
+        if not isinstance(served, str) or len(served) > 8 * TRENDING_SERVED_MAX or not SERVED.fullmatch(served):
+            raise ValueError
+        return state
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def newest_first(v):
+    return datetime.fromisoformat(str(v["created_at"]).replace("Z", "+00:00")), v["id"]
+
+
+async def following_videos(repo, user_id, limit, after, max_followers):
+    timeline, creators = await asyncio.gather(
+        repo.timeline(user_id, limit, after),
+        repo.followed_creators(user_id, max_followers),
+    )
+    if not creators:
+        return timeline
+    # fan-out on read for creators skipped by fanout_video
+    pulled = await repo.creators_videos(creators, limit, after)
+    merged = {v["id"]: v for v in timeline + pulled}
+    return sorted(merged.values(), key=newest_first, reverse=True)[:limit]
+
+
+async def unseen_trending(repo, user_id, limit, after, served):
+    # trending rows past the keyset minus the ones this scroll already showed;
+    # returns (rows, exhausted)
+    out = []
+    while True:
+        rows = await repo.trending_videos(user_id, limit, after)
+        out += [v for v in rows if served_key(v["id"]) not in served]
+        if len(rows) < limit:
+            return out, True
+        if len(out) >= limit:
+            return out, False
+        after = (rows[-1]["trending_score"], rows[-1]["id"])
+
+
+async def for_you_page(repo, user_id, limit, state, trending_every=3, max_followers=10000):
+    # state (from the cursor): f/t = last (created_at, id) / (score, id) served
+    # from each stream, fd/td = stream exhausted, s = served trending hashes
+    f_after = tuple(state["f"]) if state.get("f") else None
+    t_after = tuple(state["t"]) if state.get("t") else None
+    served = state.get("s", "")
+    served_set = {served[i:i + 8] for i in range(0, len(served), 8)}
+    following, (trending, t_exhausted) = await asyncio.gather(
+        asyncio.sleep(0, []) if state.get("fd") else following_videos(repo, user_id, limit + 1, f_after, max_followers),
+        asyncio.sleep(0, ([], True)) if state.get("td") else unseen_trending(repo, user_id, limit + 1, t_after, served_set),
+    )
+
+    # every `trending_every`-th slot is trending; either stream fills in when the other runs dry
+    out, seen = [], set()
+    fi = ti = 0
+    while len(out) < limit and (fi < len(following) or ti < len(trending)):
+        slot_is_trending = trending_every > 0 and len(out) % trending_every == trending_every - 1
+        if ti < len(trending) and (slot_is_trending or fi >= len(following)):
+            v = trending[ti]
+            ti += 1
+            t_after = (v["trending_score"], v["id"])
+            served += served_key(v["id"])
+        else:
+            v = following[fi]
+            fi += 1
+            f_after = (v["created_at"], v["id"])
+        if v["id"] not in seen:
+            seen.add(v["id"])
+            out.append(v)
+
+    f_done = bool(state.get("fd")) or (fi == len(following) and len(following) <= limit)
+    t_done = bool(state.get("td")) or (ti == len(trending) and t_exhausted)
+    next_cursor = None
+    if not (f_done and t_done):
+        next_cursor = encode_feed_cursor(
+            {"f": f_after, "t": t_after, "fd": f_done, "td": t_done, "s": served[-8 * TRENDING_SERVED_MAX:]}
+        )
+    return {"videos": out, "next_cursor": next_cursor}
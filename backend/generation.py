@@ -0,0 +1,181 @@
+import asyncio, base64, hashlib, os, struct, zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from uuid import uuid4
+from logs import get_logger
+from metrics import timed
+
+# AI image generation off the request path. POST /generate queues a job and
+# returns its id; a fixed pool of workers runs jobs through the provider and
+# hands the bytes to `store` (S3 upload + images row, see app.py). Every
+# status change is also written through `save`, so GET /generate/{id} can be
+# answered by any worker process, not just the one running the job.
+
+log = get_logger("generation")
+
+
+class OpenAIProvider:
+    def __init__(self, model="gpt-4.1-mini"):
+        self.model = model
+        self.client = None
+
+    async def generate(self, prompt):
+        if self.client is None:
+            # imported on first use so the API starts without the openai package
+            from openai import AsyncOpenAI
+            from clients import make_http_client
+            # generation takes tens of seconds; the job timeout bounds it, not the HTTP read
+            self.client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=make_http_client(pool_size=8, timeout=180.0),
+                max_retries=1,
+            )
+        with timed("openai", "image_generation", self.model):
+            response = await self.client.responses.create(
+                model=self.model,
+                input=prompt,
+                tools=[{"type": "image_generation"}],
+            )
+        for output in response.output:
+            if output.type == "image_generation_call":
+                return base64.b64decode(output.result), "image/png"
+        raise RuntimeError("provider returned no image")
+
+
+class FakeProvider:
+    # deterministic solid-colour PNG per prompt, for local runs and tests
+    def __init__(self, delay=0.0, size=64):
+        self.delay = delay
+        self.size = size
+
+    async def generate(self, prompt):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        r, g, b = hashlib.sha256(prompt.encode()).digest()[:3]
+        return solid_png(self.size, self.size, (r, g, b)), "image/png"
+
+
+def solid_png(w, h, rgb):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    raw = b"".join(b"\x00" + bytes(rgb) * w for _ in range(h))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def make_provider():
+    kind = os.getenv("GEN_PROVIDER", "openai")
+    if kind == "fake":
+        return FakeProvider(float(os.getenv("GEN_FAKE_DELAY", "0")))
+    return OpenAIProvider(os.getenv("GEN_MODEL", "gpt-4.1-mini"))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class GenerationQueue:
+    def __init__(self, provider, store, save=None, load=None, workers=2, max_pending=100, max_per_user=3, timeout=120.0, keep=1000):
+        self.provider = provider
+        self.store = store  # async (job, data, content_type) -> dict saved on the job as "image"
+        self.save = save  # async (job) -> None, persists the job's current status
+        self.load = load  # async (job_id) -> job dict or None, for jobs run by other workers
+        self.workers = workers
+        self.max_per_user = max_per_user
+        self.timeout = timeout
+        self.keep = keep
+        self.queue = asyncio.Queue(max_pending)
+        self.jobs = OrderedDict()  # id -> job dict, oldest finished ones dropped past `keep`
+        self.tasks = []
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.get_running_loop().create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self.tasks:
+            t.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        # jobs still queued die with this worker; say so instead of leaving them "queued"
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            job["status"] = "failed"
+            job["error"] = "cancelled"
+            await self._persist(job)
+
+    async def submit(self, user_id, prompt):
+        active = sum(1 for j in self.jobs.values() if j["user_id"] == user_id and j["status"] in ("queued", "running"))
+        if active >= self.max_per_user:
+            raise QueueFull("too many generations in progress for this user")
+        job = {
+            "id": str(uuid4()),
+            "user_id": user_id,
+            "prompt": prompt,
+            "status": "queued",
+            "image": None,
+            "error": None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if self.queue.full():
+            raise QueueFull("generation queue is full")
+        if self.save:
+            await self.save(job)  # before it is queued, so a poll never misses it
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:  # filled up while saving
+            job["status"] = "failed"
+            job["error"] = "generation queue is full"
+            await self._persist(job)
+            raise QueueFull(job["error"])
+        self.jobs[job["id"]] = job
+        self._trim()
+        self.start()
+        return job
+
+    async def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None and self.load:
+            job = await self.load(job_id)
+        return job
+
+    async def _persist(self, job):
+        if not self.save:
+            return
+        try:
+            await self.save(job)
+        except Exception:
+            log.warning("saving generation job failed", extra={"job": job["id"], "status": job["status"]}, exc_info=True)
+
+    async def _work(self):
+        while True:
+            job = await self.queue.get()
+            job["status"] = "running"
+            try:
+                await self._persist(job)
+                data, content_type = await asyncio.wait_for(self.provider.generate(job["prompt"]), self.timeout)
+                job["image"] = await self.store(job, data, content_type)
+                job["status"] = "done"
+            except asyncio.CancelledError:
+                job["status"] = "failed"
+                job["error"] = "cancelled"
+                await self._persist(job)
+                raise
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e) or type(e).__name__
+                log.warning("generation failed", extra={"job": job["id"], "error": job["error"]})
+            finally:
+                self.queue.task_done()
+            await self._persist(job)
+
+    def _trim(self):
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.keep:
+                break
+            if self.jobs[job_id]["status"] in ("done", "failed"):
+                del self.jobs[job_id]
@@ -0,0 +1,170 @@
+import asyncio, json, os, socket, time
+from logs import get_logger
+
+# Live updates for GET /ws. Write routes publish per-video deltas (absolute
+# like_count/comment_count, new comment rows); each connection merges what
+# arrives for the videos it watches and sends it after a short window, so a
+# burst of likes on one video is one small message. With LIVE_BROKER_DIR set,
+# the workers on a host also pass deltas to each other over unix datagram
+# sockets in that directory.
+
+MAX_COMMENTS = 20  # per video per message; older ones are in GET /videos/{id}
+
+log = get_logger("live")
+
+
+def merge(into, delta):
+    for k, v in delta.items():
+        if k == "comments":
+            rows = into.setdefault("comments", [])
+            rows.extend(v)
+            del rows[:-MAX_COMMENTS]
+        else:
+            into[k] = v  # counts are absolute: the latest wins
+
+
+class Subscriber:
+    def __init__(self, ws):
+        self.ws = ws
+        self.videos = set()
+        self.pending = {}  # video_id -> merged delta not sent yet
+        self.ready = asyncio.Event()
+
+    def push(self, video_id, delta):
+        merge(self.pending.setdefault(video_id, {}), delta)
+        self.ready.set()
+
+    async def send_loop(self, window):
+        while True:
+            await self.ready.wait()
+            await asyncio.sleep(window)  # let the burst finish
+            self.ready.clear()
+            batch, self.pending = self.pending, {}
+            # a slow client just gets a bigger merged batch next time
+            await self.ws.send_text(json.dumps({"type": "delta", "videos": batch}, default=str))
+
+
+class LocalBroker:
+    # one datagram socket per worker process in `path`; publishes go to every other one
+    def __init__(self, path, deliver):
+        self.path = path
+        self.deliver = deliver
+        self.sock = None
+        self.addr = None
+        self.peers = []
+        self.peers_at = 0.0
+
+    def start(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.addr = os.path.join(self.path, f"{os.getpid()}.sock")
+        if os.path.exists(self.addr):
+            os.unlink(self.addr)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.addr)
+        self.sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(self.sock.fileno(), self._read)
+
+    def stop(self):
+        if self.sock:
+            asyncio.get_running_loop().remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+            os.unlink(self.addr)
+
+    def _read(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return
+            try:
+                video_id, delta = json.loads(data)
+            except (TypeError, ValueError):
+                continue
+            self.deliver(video_id, delta)
+
+    def send(self, video_id, delta):
+        now = time.monotonic()
+        if now - self.peers_at > 1.0:
+            self.peers = [os.path.join(self.path, n) for n in os.listdir(self.path) if n.endswith(".sock")]
+            self.peers = [p for p in self.peers if p != self.addr]
+            self.peers_at = now
+        data = json.dumps([video_id, delta], default=str).encode()
+        for peer in self.peers:
+            try:
+                self.sock.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # left behind by a worker that exited
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+                self.peers_at = 0.0
+            except BlockingIOError:
+                pass  # peer is behind; the next delta carries the current counts anyway
+            except OSError:
+                log.warning("broker send failed", extra={"peer": peer}, exc_info=True)
+
+
+class Hub:
+    def __init__(self, window=0.25, max_videos=200, broker_dir=None):
+        self.window = window
+        self.max_videos = max_videos  # per connection
+        self.subs = {}  # video_id -> set of Subscriber
+        self.broker = LocalBroker(broker_dir, self.deliver) if broker_dir else None
+
+    def start(self):
+        if self.broker:
+            self.broker.start()
+
+    def stop(self):
+        if self.broker:
+            self.broker.stop()
+
+    def subscribe(self, sub, video_ids):
+        for vid in video_ids:
+            if len(sub.videos) >= self.max_videos:
+                break
+            if isinstance(vid, str) and vid:
+                sub.videos.add(vid)
+                self.subs.setdefault(vid, set()).add(sub)
+
+    def unsubscribe(self, sub, video_ids=None):
+        for vid in list(sub.videos if video_ids is None else video_ids):
+            sub.videos.discard(vid)
+            subs = self.subs.get(vid)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self.subs[vid]
+
+    def publish(self, video_id, **delta):
+        self.deliver(video_id, delta)
+        if self.broker:
+            self.broker.send(video_id, delta)
+
+    def deliver(self, video_id, delta):
+        for sub in self.subs.get(video_id, ()):
+            sub.push(video_id, delta)
+
+    async def serve(self, ws, video_ids=()):
+        # client -> server: {"subscribe": [ids]} / {"unsubscribe": [ids]}
+        sub = Subscriber(ws)
+        self.subscribe(sub, video_ids)
+        sender = asyncio.create_task(sub.send_loop(self.window))
+        try:
+            while True:
+                try:
+                    msg = json.loads(await ws.receive_text())
+                except ValueError:
+                    continue
+                if not isinstance(msg, dict):
+                    continue
+                if isinstance(msg.get("subscribe"), list):
+                    self.subscribe(sub, msg["subscribe"])
+                if isinstance(msg.get("unsubscribe"), list):
+                    self.unsubscribe(sub, [v for v in msg["unsubscribe"] if isinstance(v, str)])
+        finally:
+            self.unsubscribe(sub)
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
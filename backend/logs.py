@@ -0,0 +1,47 @@
+import json, logging, logging.handlers, os, queue, sys
+
+# JSON-lines logs under the "giggles" logger. Records are formatted by the
+# caller but written by a background thread, so a slow stdout never stalls
+# the event loop. LOG_LEVEL (default INFO) sets the threshold.
+
+RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        out = {"ts": round(record.created, 3), "level": record.levelname.lower(), "logger": record.name}
+        out["msg"] = record.getMessage()
+        # fields passed with extra={...}
+        out.update((k, v) for k, v in vars(record).items() if k not in RESERVED)
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+
+def get_logger(name):
+    return logging.getLogger(f"giggles.{name}")
+
+
+def setup_logging():
+    global listener
+    if listener:
+        return
+    q = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(q)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger("giggles")
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.addHandler(handler)
+    root.propagate = False
+    listener = logging.handlers.QueueListener(q, logging.StreamHandler(sys.stdout))
+    listener.start()
+
+
+def stop_logging():
+    # flushes whatever is still queued
+    global listener
+    if listener:
+        listener.stop()
+        listener = None
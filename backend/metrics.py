@@ -0,0 +1,210 @@
+import contextvars, os, random, re, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from logs import get_logger
+
+# Hot-path metrics, rendered in the Prometheus text format at GET /metrics.
+# MetricsMiddleware times every request by route template; repos and s3_call
+# report each upstream query, which is also counted against the request that
+# made it, so an N+1 shows up as a jump in queries per request. Values are
+# per worker process.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+
+# Slow requests can log their upstream calls: TRACE_SAMPLE_RATE (0 = off) of
+# the requests slower than SLOW_REQUEST_MS
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+MAX_SPANS = 100
+
+log = get_logger("metrics")
+
+
+def escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def label_str(names, values, extra=""):
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.series = {}
+
+    def inc(self, *labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, v in self.series.items():
+            yield f"{self.name}{label_str(self.labels, labels)} {v}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.series = {}  # labels -> [per-bucket counts (last is +Inf), sum]
+
+    def observe(self, value, *labels):
+        s = self.series.get(labels)
+        if s is None:
+            s = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        s[0][bisect_left(self.buckets, value)] += 1
+        s[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in self.series.items():
+            n = 0
+            for le, c in zip((*self.buckets, "+Inf"), counts):
+                n += c
+                bucket = label_str(self.labels, labels, 'le="%s"' % le)
+                yield f"{self.name}_bucket{bucket} {n}"
+            yield f"{self.name}_sum{label_str(self.labels, labels)} {total}"
+            yield f"{self.name}_count{label_str(self.labels, labels)} {n}"
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route template.", ("method", "route", "status")
+)
+REQUEST_BYTES = Histogram(
+    "http_request_size_bytes", "Request body size (Content-Length).", ("method", "route"), SIZE_BUCKETS
+)
+RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "Response body size as sent (after compression).", ("method", "route"), SIZE_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_upstream_queries", "Upstream queries made by one request.", ("method", "route"), QUERY_BUCKETS
+)
+UPSTREAM_QUERIES = Counter(
+    "upstream_queries_total", "Upstream queries by table/operation.", ("upstream", "operation", "table")
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total", "Upstream queries that raised.", ("upstream", "operation", "table")
+)
+UPSTREAM_SECONDS = Histogram(
+    "upstream_duration_seconds", "Upstream call latency, retries included.", ("upstream", "operation", "table")
+)
+METRICS = [REQUEST_SECONDS, REQUEST_BYTES, RESPONSE_BYTES, REQUEST_QUERIES, UPSTREAM_QUERIES, UPSTREAM_ERRORS, UPSTREAM_SECONDS]
+
+
+class Trace:
+    __slots__ = ("queries", "spans", "open")
+
+    def __init__(self, sampled):
+        self.queries = 0
+        self.spans = [] if sampled else None
+        self.open = True
+
+
+current = contextvars.ContextVar("trace", default=None)
+
+
+def query(upstream, operation, table="", seconds=None, error=False):
+    key = (upstream, operation, table)
+    UPSTREAM_QUERIES.inc(*key)
+    if error:
+        UPSTREAM_ERRORS.inc(*key)
+    if seconds is not None:
+        UPSTREAM_SECONDS.observe(seconds, *key)
+    t = current.get()
+    # closed: a background task that outlived the request which started it
+    if t is not None and t.open:
+        t.queries += 1
+        if t.spans is not None and len(t.spans) < MAX_SPANS:
+            t.spans.append({"upstream": upstream, "op": operation, "table": table,
+                            "ms": round(seconds * 1000, 2) if seconds is not None else None, "error": error})
+
+
+@contextmanager
+def timed(upstream, operation, table=""):
+    start = time.perf_counter()
+    error = True
+    try:
+        yield
+        error = False
+    finally:
+        query(upstream, operation, table, time.perf_counter() - start, error)
+
+
+STATEMENT = re.compile(r"\s*(\w+)")
+TABLE = re.compile(r"\b(?:from|into|update)\s+(\w+)", re.I)
+SKIP = {"begin", "commit", "rollback", "savepoint", "release", "pragma", "create", "drop"}
+
+
+def sqlite_statement(sql):
+    # sqlite3 trace callback: counts statements, which run inline and are not timed
+    m = STATEMENT.match(sql)
+    if not m or m[1].lower() in SKIP:
+        return
+    t = TABLE.search(sql)
+    query("sqlite", m[1].lower(), t[1] if t else "")
+
+
+def render(extra=()):
+    lines = []
+    for m in METRICS:
+        lines.extend(m.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
+
+
+def collected(name, help, kind, samples):
+    # values read from elsewhere at scrape time; samples: [(labels dict, value)]
+    yield f"# HELP {name} {help}"
+    yield f"# TYPE {name} {kind}"
+    for labels, v in samples:
+        yield f"{name}{label_str(list(labels), list(labels.values()))} {v}"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        trace = Trace(TRACE_SAMPLE_RATE > 0)
+        token = current.set(trace)
+        start = time.perf_counter()
+        status, size = 500, 0
+
+        async def observe(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, observe)
+        finally:
+            trace.open = False
+            current.reset(token)
+            elapsed = time.perf_counter() - start
+            # the template, not the path, so ids don't explode the label set
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUEST_SECONDS.observe(elapsed, method, route, str(status))
+            RESPONSE_BYTES.observe(size, method, route)
+            REQUEST_QUERIES.observe(trace.queries, method, route)
+            length = next((v for k, v in scope["headers"] if k == b"content-length"), None)
+            if length and length.isdigit():
+                REQUEST_BYTES.observe(int(length), method, route)
+            if trace.spans is not None and elapsed * 1000 >= SLOW_REQUEST_MS and random.random() < TRACE_SAMPLE_RATE:
+                log.warning(
+                    "slow request",
+                    extra={"method": method, "route": route, "path": scope["path"], "status": status,
+                           "ms": round(elapsed * 1000, 1), "queries": trace.queries, "spans": trace.spans},
+                )
@@ -0,0 +1,59 @@
+from hashlib import blake2b
+
+# ETags for JSON GET responses. The body is hashed before compression
+# (GZipMiddleware sits outside this one), so the gzip and identity bytes share
+# one tag; that makes it a weak validator (W/"..."), which is all If-None-Match
+# needs. A match gets a bodiless 304 so the app re-downloads nothing when a
+# feed/profile is unchanged.
+
+
+class ETagMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return await self.app(scope, receive, send)
+
+        start = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                await self.finish(scope, start, b"".join(chunks), send)
+
+        await self.app(scope, receive, capture)
+
+    async def finish(self, scope, start, body, send):
+        headers = list(start["headers"])
+        content_type = next((v for k, v in headers if k == b"content-type"), b"")
+        if start["status"] != 200 or not content_type.startswith(b"application/json"):
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        etag = b'"' + blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+        headers += [(b"etag", b"W/" + etag), (b"cache-control", b"no-cache")]
+        if etag_matches(scope, etag):
+            headers = [(k, v) for k, v in headers if k not in (b"content-length", b"content-type")]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({**start, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def etag_matches(scope, etag):
+    # weak comparison (RFC 9110 13.1.2): W/ prefixes are ignored on both sides
+    for k, v in scope["headers"]:
+        if k == b"if-none-match":
+            tags = [t.strip().removeprefix(b"W/") for t in v.split(b",")]
+            return b"*" in tags or etag in tags
+    return False
@@ -0,0 +1,982 @@
+import base64, json, math, os, re, sqlite3, threading, time
+from collections import Counter
+from uuid import uuid4
+from datetime import datetime, timezone
+from postgrest.exceptions import APIError
+from clients import db_policy, make_http_client
+from metrics import sqlite_statement, timed
+
+# Data access for the API. Routes only talk to a repo; SupabaseRepo hits the
+# live project, SqliteRepo mirrors the same tables locally for tests/benchmarks.
+
+VIDEO_JOIN = "*, users!videos_user_id_fkey(username)"
+COMMENT_COLS = "id, user_id, text, created_at, username, users!comments_user_id_fkey(username)"
+IMAGE_COLS = "id, user_id, storage_path, url, mime_type, caption, prompt, created_at"
+USER_COLS = "id, username, avatar_url, aura, follower_count, following_count, videos!videos_user_id_fkey(count)"
+JOB_COLS = ("id", "user_id", "prompt", "status", "image", "error", "created_at")
+# just what a feed card renders
+FEED_COLS = (
+    "id, user_id, url, hls_url, poster_url, preview_url, caption, like_count, comment_count, created_at,"
+    " users!videos_user_id_fkey(username)"
+)
+
+
+PGRST_OPS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+def query_labels(request):
+    # (operation, table) of a PostgREST request, for metrics
+    _, _, name = request.path.path.rpartition("/")
+    if "/rpc/" in request.path.path:
+        return "rpc", name
+    return PGRST_OPS.get(request.http_method, request.http_method.lower()), name
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def image_search_text(storage_path, caption, prompt):
+    # same as public.image_search_text (009_image_search_filename.sql): the
+    # original filename's stem, without the images/{user_id}/{image_id}_ prefix
+    stem = re.sub(r"\.[A-Za-z0-9]+$", "", re.sub(r"^[^/]+/[^/]+/[^/_]*_", "", storage_path or ""))
+    return f"{re.sub(r'[^A-Za-z0-9]+', ' ', stem)} {caption or ''} {prompt or ''}"
+
+
+def hot_score(likes, comments, created_at):
+    # same as public.video_hot_score (004_for_you_feed.sql)
+    ts = datetime.fromisoformat(str(created_at).replace("Z", "+00:00")).timestamp() if created_at else time.time()
+    return math.log10(max((likes or 0) + 2 * (comments or 0), 1)) + ts / 45000
+
+
+# Feed cursors are opaque to clients: base64 of the (created_at, id) of the
+# last row served. Raw created_at strings from older clients still work.
+def encode_cursor(row):
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+# uuids, plus the short ids bench.py seeds; nothing that could break out of a PostgREST filter
+ROW_ID = re.compile(r"[0-9A-Za-z_-]{1,64}")
+
+
+def check_keyset(created_at, vid):
+    # cursor values end up inside or_() filter strings, so only let through what they can be
+    if not isinstance(created_at, str) or not isinstance(vid, str) or not ROW_ID.fullmatch(vid):
+        raise ValueError("invalid cursor")
+    datetime.fromisoformat(created_at.replace("Z", "+00:00"))  # ValueError if garbage
+    return created_at, vid
+
+
+def decode_cursor(token):
+    try:
+        pair = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except ValueError:
+        pair = None
+    if isinstance(pair, list):
+        if len(pair) != 2:
+            raise ValueError("invalid cursor")
+        return check_keyset(*pair)
+    datetime.fromisoformat(token.replace("Z", "+00:00"))  # ValueError if garbage
+    return token, None
+
+
+class SupabaseRepo:
+    def __init__(self, url, key):
+        self.url = url
+        self.key = key
+        self.sb = None
+        self.http = None
+        self.policy = db_policy()
+
+    async def connect(self):
+        if self.sb is None:
+            from supabase import acreate_client, AsyncClientOptions
+            # one pooled HTTP/2 client for every PostgREST call (clients.py)
+            self.http = make_http_client()
+            self.sb = await acreate_client(self.url, self.key, options=AsyncClientOptions(httpx_client=self.http))
+
+    async def close(self):
+        if self.http:
+            await self.http.aclose()
+        self.sb = self.http = None
+
+    async def ping(self):
+        await self._execute(self.sb.table("users").select("id").limit(1))
+
+    async def _execute(self, q, idempotent=None):
+        # reads, updates and deletes are safe to re-send; inserts and RPCs only when marked
+        if idempotent is None:
+            idempotent = q.request.http_method in ("GET", "HEAD", "PATCH", "DELETE")
+        with timed("supabase", *query_labels(q.request)):
+            return await self.policy.call(q.execute, idempotent)
+
+    async def _data(self, q, idempotent=None):
+        return (await self._execute(q, idempotent)).data
+
+    async def _count(self, q):
+        return (await self._execute(q)).count or 0
+
+    async def _one(self, q):
+        # first row or None; .single() would turn a missing row into an APIError
+        rows = await self._data(q.limit(1))
+        return rows[0] if rows else None
+
+    # videos
+    async def insert_video(self, row):
+        await self._execute(self.sb.table("videos").insert(row))
+
+    @staticmethod
+    def _after(q, after, id_col="id"):
+        # keyset filter: rows strictly older than (created_at, id)
+        if not after:
+            return q
+        created_at, vid = after
+        if vid is None:
+            return q.lt("created_at", created_at)
+        return q.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",{id_col}.lt."{vid}")')
+
+    async def list_videos(self, limit, after=None):
+        q = self._after(self.sb.table("videos").select(FEED_COLS), after)
+        return await self._data(q.order("created_at", desc=True).order("id", desc=True).limit(limit)) or []
+
+    async def get_video(self, video_id):
+        return await self._one(self.sb.table("videos").select(VIDEO_JOIN).eq("id", video_id))
+
+    async def get_videos(self, ids, comments_limit=0):
+        # one round trip: uploader and the newest N comments per video come embedded
+        cols = VIDEO_JOIN
+        if comments_limit > 0:
+            cols += f", comments({COMMENT_COLS})"
+        q = self.sb.table("videos").select(cols).in_("id", ids)
+        if comments_limit > 0:
+            q = q.order("created_at", desc=True, foreign_table="comments").limit(comments_limit, foreign_table="comments")
+        return await self._data(q) or []
+
+    async def video_counts(self, ids):
+        # stored counters: {video_id: (like_count, comment_count)}
+        rows = await self._data(self.sb.table("videos").select("id, like_count, comment_count").in_("id", list(ids))) or []
+        return {r["id"]: (r["like_count"] or 0, r["comment_count"] or 0) for r in rows}
+
+    async def update_video(self, video_id, **fields):
+        await self._execute(self.sb.table("videos").update(fields).eq("id", video_id))
+
+    async def user_videos(self, user_id, limit, cursor=None):
+        q = self.sb.table("videos").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(limit)
+        if cursor:
+            q = q.lt("created_at", cursor)
+        return await self._data(q) or []
+
+    async def count_user_videos(self, user_id):
+        return await self._count(self.sb.table("videos").select("*", count="exact", head=True).eq("user_id", user_id))
+
+    async def bump_video_counts(self, deltas):
+        # deltas: {video_id: (likes, comments)} -> {video_id: (like_count, comment_count)}
+        payload = [{"id": k, "likes": l, "comments": c} for k, (l, c) in deltas.items()]
+        rows = await self._data(self.sb.rpc("bump_video_counters", {"p_deltas": payload})) or []
+        return {r["id"]: (r["like_count"], r["comment_count"]) for r in rows}
+
+    # likes: like/unlike write the row and bump the counter in one RPC
+    async def like(self, video_id, user_id):
+        return int(await self._data(self.sb.rpc("like_video", {"p_video_id": video_id, "p_user_id": user_id}), True) or 0)
+
+    async def unlike(self, video_id, user_id):
+        return int(await self._data(self.sb.rpc("unlike_video", {"p_video_id": video_id, "p_user_id": user_id}), True) or 0)
+
+    # row-only writes for write-behind mode; True when something changed
+    async def add_like(self, video_id, user_id):
+        row = {"video_id": video_id, "user_id": user_id}
+        return bool(await self._data(self.sb.table("likes").upsert(row, ignore_duplicates=True)))
+
+    async def remove_like(self, video_id, user_id):
+        return bool(await self._data(self.sb.table("likes").delete().eq("video_id", video_id).eq("user_id", user_id)))
+
+    # bulk versions for POST /actions/batch; they return the ids that changed
+    async def add_likes(self, user_id, video_ids):
+        rows = [{"video_id": v, "user_id": user_id} for v in video_ids]
+        return [r["video_id"] for r in await self._data(self.sb.table("likes").upsert(rows, ignore_duplicates=True)) or []]
+
+    async def remove_likes(self, user_id, video_ids):
+        q = self.sb.table("likes").delete().eq("user_id", user_id).in_("video_id", video_ids)
+        return [r["video_id"] for r in await self._data(q) or []]
+
+    async def count_likes(self, video_id):
+        return await self._count(self.sb.table("likes").select("*", count="exact", head=True).eq("video_id", video_id))
+
+    async def count_likes_many(self, video_ids):
+        rows = await self._data(self.sb.table("likes").select("video_id").in_("video_id", video_ids)) or []
+        return Counter(r["video_id"] for r in rows)
+
+    async def liked_video_ids(self, user_id, limit):
+        return [r["video_id"] for r in await self.user_likes(user_id, limit)]
+
+    async def user_likes(self, user_id, limit, after=None):
+        # newest like first, keyset on (created_at, video_id); see 010_likes_by_user.sql
+        q = self._after(self.sb.table("likes").select("video_id, created_at").eq("user_id", user_id), after, "video_id")
+        return await self._data(q.order("created_at", desc=True).order("video_id", desc=True).limit(limit)) or []
+
+    # comments
+    async def add_comment(self, video_id, user_id, text):
+        args = {"p_video_id": video_id, "p_user_id": user_id, "p_text": text}
+        res = await self._data(self.sb.rpc("add_video_comment", args))
+        return res["comment"], int(res["comment_count"])
+
+    async def insert_comment(self, row):
+        data = await self._data(self.sb.table("comments").insert(row)) or []
+        return data[0] if data else None
+
+    async def insert_comments(self, rows):
+        return await self._data(self.sb.table("comments").insert(rows)) or []
+
+    async def count_comments(self, video_id):
+        return await self._count(self.sb.table("comments").select("*", count="exact", head=True).eq("video_id", video_id))
+
+    async def count_comments_many(self, video_ids):
+        rows = await self._data(self.sb.table("comments").select("video_id").in_("video_id", video_ids)) or []
+        return Counter(r["video_id"] for r in rows)
+
+    async def list_comments(self, video_id, limit):
+        return await self._data(
+            self.sb.table("comments")
+            .select(COMMENT_COLS)
+            .eq("video_id", video_id)
+            .order("created_at", desc=True)
+            .limit(limit)
+        ) or []
+
+    # users
+    async def get_user(self, user_id):
+        # profile in one query: stored follow counters (002_atomic_counters.sql) and the post count
+        try:
+            u = await self._one(self.sb.table("users").select(USER_COLS).eq("id", user_id))
+        except APIError as e:
+            # older schemas have no aura column (42703: undefined column)
+            if e.code != "42703":
+                raise
+            return await self._one(self.sb.table("users").select("id, username, avatar_url").eq("id", user_id))
+        if u:
+            u["video_count"] = (u.pop("videos", None) or [{}])[0].get("count", 0)
+        return u
+
+    async def get_username(self, user_id):
+        u = await self._one(self.sb.table("users").select("username").eq("id", user_id))
+        return u["username"] if u else None
+
+    # follows
+    async def is_following(self, follower_id, target_id):
+        rows = await self._data(
+            self.sb.table("follows")
+            .select("follower_id")
+            .eq("follower_id", follower_id)
+            .eq("followed_id", target_id)
+            .limit(1)
+        ) or []
+        return len(rows) > 0
+
+    # both return the target's new follower count
+    async def follow(self, follower_id, target_id):
+        args = {"p_follower_id": follower_id, "p_followed_id": target_id}
+        return int(await self._data(self.sb.rpc("follow_user", args), True) or 0)
+
+    async def unfollow(self, follower_id, target_id):
+        args = {"p_follower_id": follower_id, "p_followed_id": target_id}
+        return int(await self._data(self.sb.rpc("unfollow_user", args), True) or 0)
+
+    async def count_followers(self, user_id):
+        return await self._count(self.sb.table("follows").select("*", count="exact", head=True).eq("followed_id", user_id))
+
+    async def count_following(self, user_id):
+        return await self._count(self.sb.table("follows").select("*", count="exact", head=True).eq("follower_id", user_id))
+
+    async def add_follows(self, follower_id, target_ids):
+        rows = [{"follower_id": follower_id, "followed_id": t} for t in target_ids]
+        return [r["followed_id"] for r in await self._data(self.sb.table("follows").upsert(rows, ignore_duplicates=True)) or []]
+
+    async def remove_follows(self, follower_id, target_ids):
+        q = self.sb.table("follows").delete().eq("follower_id", follower_id).in_("followed_id", target_ids)
+        return [r["followed_id"] for r in await self._data(q) or []]
+
+    async def bump_user_counts(self, deltas):
+        # deltas: {user_id: (followers, following)} -> {user_id: (follower_count, following_count)}
+        payload = [{"id": k, "followers": a, "following": b} for k, (a, b) in deltas.items()]
+        rows = await self._data(self.sb.rpc("bump_user_counters", {"p_deltas": payload})) or []
+        return {r["id"]: (r["follower_count"], r["following_count"]) for r in rows}
+
+    async def user_counts(self, ids):
+        # stored counters: {user_id: (follower_count, following_count)}
+        rows = await self._data(self.sb.table("users").select("id, follower_count, following_count").in_("id", list(ids))) or []
+        return {r["id"]: (r["follower_count"] or 0, r["following_count"] or 0) for r in rows}
+
+    # for-you feed (004_for_you_feed.sql)
+    async def fanout_video(self, video_id, max_followers):
+        args = {"p_video_id": video_id, "p_max_followers": max_followers}
+        return int(await self._data(self.sb.rpc("fanout_video", args), True) or 0)
+
+    async def backfill_timeline(self, user_id, author_id, limit, max_followers):
+        args = {"p_user_id": user_id, "p_author_id": author_id, "p_limit": limit, "p_max_followers": max_followers}
+        return int(await self._data(self.sb.rpc("backfill_timeline", args), True) or 0)
+
+    async def prune_timeline(self, user_id, author_id):
+        await self._execute(self.sb.table("timelines").delete().eq("user_id", user_id).eq("author_id", author_id))
+
+    async def timeline(self, user_id, limit, after=None):
+        q = self.sb.table("timelines").select(f"created_at, video_id, videos({FEED_COLS})").eq("user_id", user_id)
+        q = self._after(q, after, "video_id").order("created_at", desc=True).order("video_id", desc=True)
+        return [r["videos"] for r in await self._data(q.limit(limit)) or [] if r.get("videos")]
+
+    async def followed_creators(self, user_id, min_followers):
+        args = {"p_user_id": user_id, "p_min_followers": min_followers}
+        return [r["user_id"] for r in await self._data(self.sb.rpc("followed_creators", args), True) or []]
+
+    async def creators_videos(self, user_ids, limit, after=None):
+        q = self._after(self.sb.table("videos").select(FEED_COLS).in_("user_id", user_ids), after)
+        return await self._data(q.order("created_at", desc=True).order("id", desc=True).limit(limit)) or []
+
+    async def trending_videos(self, user_id, limit, after=None):
+        # 007_feed_trending_disjoint.sql: skips the user's timeline and followed creators
+        score, vid = after or (None, None)
+        args = {"p_user_id": user_id, "p_limit": limit, "p_score": score, "p_id": vid}
+        return await self._data(self.sb.rpc("trending_for_user", args).select(f"{FEED_COLS}, trending_score"), True) or []
+
+    # images
+    async def insert_image(self, row):
+        await self._execute(self.sb.table("images").insert(row))
+
+    async def list_images(self, user_id, limit, cursor=None):
+        q = self.sb.table("images").select(IMAGE_COLS).eq("user_id", user_id).order("created_at", desc=True).limit(limit)
+        if cursor:
+            q = q.lt("created_at", cursor)
+        return await self._data(q) or []
+
+    async def search_images(self, user_id, tokens, limit, offset=0):
+        # ranked tsvector match over filename words, caption and prompt (003, 009_image_search_filename.sql)
+        args = {"p_user_id": user_id, "p_query": " | ".join(f"{t}:*" for t in tokens), "p_limit": limit, "p_offset": offset}
+        rows = await self._data(self.sb.rpc("search_images", args), True) or []
+        for r in rows:
+            r.pop("search", None)
+        return rows
+
+    async def get_image(self, image_id):
+        return await self._one(self.sb.table("images").select("id,storage_path,user_id").eq("id", image_id))
+
+    async def delete_image(self, image_id):
+        await self._execute(self.sb.table("images").delete().eq("id", image_id))
+
+    # generation jobs (008_generation_jobs.sql)
+    async def save_generation_job(self, job):
+        row = {k: job[k] for k in JOB_COLS} | {"updated_at": now_iso()}
+        await self._execute(self.sb.table("generation_jobs").upsert(row), True)
+
+    async def get_generation_job(self, job_id):
+        return await self._one(self.sb.table("generation_jobs").select(", ".join(JOB_COLS)).eq("id", job_id))
+
+
+SCHEMA = """
+create table if not exists users (
+    id text primary key,
+    username text,
+    avatar_url text,
+    aura integer default 0,
+    follower_count integer default 0,
+    following_count integer default 0,
+    created_at text
+);
+create table if not exists videos (
+    id text primary key,
+    user_id text references users(id),
+    s3_key text,
+    url text,
+    caption text,
+    like_count integer default 0,
+    comment_count integer default 0,
+    trending_score real default 0,
+    hls_url text,
+    poster_url text,
+    preview_url text,
+    media_status text,
+    created_at text
+);
+create index if not exists videos_user_created on videos(user_id, created_at);
+create index if not exists videos_created_id on videos(created_at, id);
+create index if not exists videos_trending on videos(trending_score, id);
+-- hot_score() is registered on the connection (see SqliteRepo.__init__)
+create trigger if not exists videos_trending_insert after insert on videos begin
+    update videos set trending_score = hot_score(new.like_count, new.comment_count, new.created_at) where id = new.id;
+end;
+create trigger if not exists videos_trending_update after update of like_count, comment_count on videos begin
+    update videos set trending_score = hot_score(new.like_count, new.comment_count, new.created_at) where id = new.id;
+end;
+create table if not exists likes (
+    video_id text references videos(id) on delete cascade,
+    user_id text references users(id),
+    created_at text,
+    primary key (video_id, user_id)
+);
+create index if not exists likes_user_created on likes(user_id, created_at, video_id);
+create table if not exists comments (
+    id text primary key,
+    video_id text references videos(id) on delete cascade,
+    user_id text references users(id),
+    username text,
+    text text,
+    created_at text
+);
+create index if not exists comments_video_created on comments(video_id, created_at);
+create table if not exists follows (
+    follower_id text references users(id),
+    followed_id text references users(id),
+    created_at text,
+    primary key (follower_id, followed_id)
+);
+create index if not exists follows_followed on follows(followed_id);
+create table if not exists timelines (
+    user_id text references users(id) on delete cascade,
+    video_id text references videos(id) on delete cascade,
+    author_id text references users(id) on delete cascade,
+    created_at text,
+    primary key (user_id, video_id)
+);
+create index if not exists timelines_user_created on timelines(user_id, created_at, video_id);
+create index if not exists timelines_user_author on timelines(user_id, author_id);
+create table if not exists images (
+    id text primary key,
+    user_id text references users(id),
+    storage_path text,
+    url text,
+    mime_type text,
+    caption text,
+    prompt text,
+    created_at text
+);
+create index if not exists images_user_created on images(user_id, created_at);
+create table if not exists generation_jobs (
+    id text primary key,
+    user_id text,
+    prompt text,
+    status text,
+    image text,
+    error text,
+    created_at text,
+    updated_at text
+);
+-- inverted index for /images/search, kept in step with images by triggers
+create virtual table if not exists images_fts using fts5(body, user_id unindexed);
+-- dropped and re-created on every start, so older files pick up changes
+drop trigger if exists images_fts_insert;
+drop trigger if exists images_fts_delete;
+drop trigger if exists images_fts_update;
+create trigger images_fts_insert after insert on images begin
+    insert into images_fts (rowid, body, user_id)
+    values (new.rowid, image_search_text(new.storage_path, new.caption, new.prompt), new.user_id);
+end;
+create trigger images_fts_delete after delete on images begin
+    delete from images_fts where rowid = old.rowid;
+end;
+create trigger images_fts_update after update of storage_path, caption, prompt on images begin
+    update images_fts set body = image_search_text(new.storage_path, new.caption, new.prompt) where rowid = new.rowid;
+end;"""
+
+# FEED_COLS for SqliteRepo; _embed_user turns _username into the users object
+FEED_SELECT = (
+    "select v.id, v.user_id, v.url, v.hls_url, v.poster_url, v.preview_url, v.caption, v.like_count,"
+    " v.comment_count, v.created_at, u.username as _username"
+)
+
+
+class SqliteRepo:
+    # Calls run inline on the event loop: they are local and sub-millisecond,
+    # so handing them to a thread would cost more than it saves.
+    def __init__(self, path=":memory:"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("pragma foreign_keys = on")
+        self.conn.create_function("hot_score", 3, hot_score, deterministic=True)
+        self.conn.create_function("image_search_text", 3, image_search_text, deterministic=True)
+        self.conn.set_trace_callback(sqlite_statement)
+        self.conn.executescript(SCHEMA)
+        if self.conn.execute("pragma user_version").fetchone()[0] < 1:
+            # files from before image_search_text indexed the whole storage_path
+            self.conn.executescript("""
+                begin;
+                delete from images_fts;
+                insert into images_fts (rowid, body, user_id)
+                    select rowid, image_search_text(storage_path, caption, prompt), user_id from images;
+                pragma user_version = 1;
+                commit;
+            """)
+        self.lock = threading.Lock()
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def ping(self):
+        self._one("select 1")
+
+    def _all(self, sql, args=()):
+        with self.lock:
+            return [dict(r) for r in self.conn.execute(sql, args).fetchall()]
+
+    def _one(self, sql, args=()):
+        rows = self._all(sql, args)
+        return rows[0] if rows else None
+
+    def _write(self, sql, args=()):
+        with self.lock, self.conn:
+            return self.conn.execute(sql, args).rowcount
+
+    def _count(self, sql, args=()):
+        with self.lock:
+            return self.conn.execute(sql, args).fetchone()[0]
+
+    def insert_rows(self, table, rows):
+        rows = [{"created_at": now_iso(), **r} for r in rows]
+        if not rows:
+            return
+        cols = list(rows[0])
+        sql = f"insert into {table} ({', '.join(cols)}) values ({', '.join('?' for _ in cols)})"
+        with self.lock, self.conn:
+            self.conn.executemany(sql, [[r.get(c) for c in cols] for r in rows])
+
+    def recount(self):
+        # rebuild every stored counter from the rows, like the 002 migration backfill
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                update videos set
+                    like_count = (select count(*) from likes l where l.video_id = videos.id),
+                    comment_count = (select count(*) from comments c where c.video_id = videos.id);
+                update users set
+                    follower_count = (select count(*) from follows f where f.followed_id = users.id),
+                    following_count = (select count(*) from follows f where f.follower_id = users.id);
+            """)
+
+    def rebuild_timelines(self):
+        # fill timelines from follows, like the 004 migration backfill
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                insert or ignore into timelines (user_id, video_id, author_id, created_at)
+                    select f.follower_id, v.id, v.user_id, v.created_at
+                    from follows f join videos v on v.user_id = f.followed_id;
+                insert or ignore into timelines (user_id, video_id, author_id, created_at)
+                    select v.user_id, v.id, v.user_id, v.created_at from videos v;
+            """)
+
+    @staticmethod
+    def _embed_user(row):
+        # same shape PostgREST returns for users!..._fkey(username)
+        username = row.pop("_username", None)
+        row["users"] = {"username": username} if username is not None else None
+        return row
+
+    # videos
+    async def insert_video(self, row):
+        self.insert_rows("videos", [row])
+
+    @staticmethod
+    def _after(after, ts_col="v.created_at", id_col="v.id"):
+        # keyset condition for rows strictly older than (created_at, id)
+        if not after:
+            return "1", []
+        created_at, vid = after
+        if vid is None:
+            return f"{ts_col} < ?", [created_at]
+        return f"({ts_col} < ? or ({ts_col} = ? and {id_col} < ?))", [created_at, created_at, vid]
+
+    async def list_videos(self, limit, after=None):
+        cond, args = self._after(after)
+        sql = (
+            f"{FEED_SELECT} from videos v left join users u on u.id = v.user_id"
+            f" where {cond} order by v.created_at desc, v.id desc limit ?"
+        )
+        return [self._embed_user(r) for r in self._all(sql, (*args, limit))]
+
+    async def get_video(self, video_id):
+        row = self._one(
+            "select v.*, u.username as _username from videos v left join users u on u.id = v.user_id where v.id = ?",
+            (video_id,),
+        )
+        return self._embed_user(row) if row else None
+
+    async def get_videos(self, ids, comments_limit=0):
+        marks = ", ".join("?" for _ in ids)
+        rows = [
+            self._embed_user(r)
+            for r in self._all(
+                "select v.*, u.username as _username from videos v left join users u on u.id = v.user_id"
+                f" where v.id in ({marks})",
+                ids,
+            )
+        ]
+        if comments_limit > 0:
+            by_video = {r["id"]: r for r in rows}
+            for r in rows:
+                r["comments"] = []
+            comments = self._all(
+                "select * from (select c.id, c.video_id, c.user_id, c.text, c.created_at, c.username,"
+                " u.username as _username,"
+                " row_number() over (partition by c.video_id order by c.created_at desc) as _rank"
+                f" from comments c left join users u on u.id = c.user_id where c.video_id in ({marks}))"
+                " where _rank <= ? order by created_at desc",
+                (*ids, comments_limit),
+            )
+            for c in comments:
+                del c["_rank"]
+                by_video[c.pop("video_id")]["comments"].append(self._embed_user(c))
+        return rows
+
+    async def video_counts(self, ids):
+        ids = list(ids)
+        marks = ", ".join("?" for _ in ids)
+        rows = self._all(f"select id, like_count, comment_count from videos where id in ({marks})", ids)
+        return {r["id"]: (r["like_count"] or 0, r["comment_count"] or 0) for r in rows}
+
+    async def update_video(self, video_id, **fields):
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        self._write(f"update videos set {sets} where id = ?", (*fields.values(), video_id))
+
+    async def bump_video_counts(self, deltas):
+        out = {}
+        with self.lock, self.conn:
+            for vid, (likes, comments) in deltas.items():
+                row = self.conn.execute(
+                    "update videos set like_count = max(coalesce(like_count, 0) + ?, 0),"
+                    " comment_count = max(coalesce(comment_count, 0) + ?, 0)"
+                    " where id = ? returning like_count, comment_count",
+                    (likes, comments, vid),
+                ).fetchone()
+                if row:
+                    out[vid] = (row[0], row[1])
+        return out
+
+    async def user_videos(self, user_id, limit, cursor=None):
+        sql = "select * from videos where user_id = ?"
+        args = [user_id]
+        if cursor:
+            sql += " and created_at < ?"
+            args.append(cursor)
+        return self._all(sql + " order by created_at desc limit ?", (*args, limit))
+
+    async def count_user_videos(self, user_id):
+        return self._count("select count(*) from videos where user_id = ?", (user_id,))
+
+    # likes: the row write and counter bump share one transaction, like the RPCs
+    def _toggle(self, write_sql, write_args, bump_sql, read_sql, key):
+        with self.lock, self.conn:
+            if self.conn.execute(write_sql, write_args).rowcount:
+                self.conn.execute(bump_sql, (key,))
+            row = self.conn.execute(read_sql, (key,)).fetchone()
+        return int(row[0] or 0) if row else 0
+
+    async def like(self, video_id, user_id):
+        return self._toggle(
+            "insert or ignore into likes (video_id, user_id, created_at) values (?, ?, ?)",
+            (video_id, user_id, now_iso()),
+            "update videos set like_count = coalesce(like_count, 0) + 1 where id = ?",
+            "select like_count from videos where id = ?",
+            video_id,
+        )
+
+    async def unlike(self, video_id, user_id):
+        return self._toggle(
+            "delete from likes where video_id = ? and user_id = ?",
+            (video_id, user_id),
+            "update videos set like_count = max(coalesce(like_count, 0) - 1, 0) where id = ?",
+            "select like_count from videos where id = ?",
+            video_id,
+        )
+
+    async def add_like(self, video_id, user_id):
+        return self._write(
+            "insert or ignore into likes (video_id, user_id, created_at) values (?, ?, ?)",
+            (video_id, user_id, now_iso()),
+        ) > 0
+
+    async def remove_like(self, video_id, user_id):
+        return self._write("delete from likes where video_id = ? and user_id = ?", (video_id, user_id)) > 0
+
+    def _returning(self, sql, args):
+        with self.lock, self.conn:
+            return [r[0] for r in self.conn.execute(sql, args).fetchall()]
+
+    async def add_likes(self, user_id, video_ids):
+        now = now_iso()
+        values = ", ".join("(?, ?, ?)" for _ in video_ids)
+        args = [x for v in video_ids for x in (v, user_id, now)]
+        return self._returning(f"insert or ignore into likes (video_id, user_id, created_at) values {values} returning video_id", args)
+
+    async def remove_likes(self, user_id, video_ids):
+        marks = ", ".join("?" for _ in video_ids)
+        return self._returning(
+            f"delete from likes where user_id = ? and video_id in ({marks}) returning video_id", (user_id, *video_ids)
+        )
+
+    async def count_likes(self, video_id):
+        return self._count("select count(*) from likes where video_id = ?", (video_id,))
+
+    async def count_likes_many(self, video_ids):
+        marks = ", ".join("?" for _ in video_ids)
+        rows = self._all(f"select video_id, count(*) as n from likes where video_id in ({marks}) group by video_id", video_ids)
+        return Counter({r["video_id"]: r["n"] for r in rows})
+
+    async def liked_video_ids(self, user_id, limit):
+        return [r["video_id"] for r in await self.user_likes(user_id, limit)]
+
+    async def user_likes(self, user_id, limit, after=None):
+        cond, args = self._after(after, "created_at", "video_id")
+        return self._all(
+            f"select video_id, created_at from likes where user_id = ? and {cond}"
+            " order by created_at desc, video_id desc limit ?",
+            (user_id, *args, limit),
+        )
+
+    # comments
+    async def add_comment(self, video_id, user_id, text):
+        row = {"id": str(uuid4()), "video_id": video_id, "user_id": user_id, "text": text, "created_at": now_iso()}
+        with self.lock, self.conn:
+            u = self.conn.execute("select username from users where id = ?", (user_id,)).fetchone()
+            row["username"] = u[0] if u else None
+            self.conn.execute(
+                "insert into comments (id, video_id, user_id, username, text, created_at) values (?, ?, ?, ?, ?, ?)",
+                (row["id"], video_id, user_id, row["username"], text, row["created_at"]),
+            )
+            n = self.conn.execute(
+                "update videos set comment_count = coalesce(comment_count, 0) + 1 where id = ? returning comment_count",
+                (video_id,),
+            ).fetchone()
+        return row, int(n[0]) if n else 0
+
+    async def insert_comment(self, row):
+        row = {"id": row.get("id") or str(uuid4()), "created_at": now_iso(), **row}
+        self.insert_rows("comments", [row])
+        return row
+
+    async def insert_comments(self, rows):
+        rows = [{"id": r.get("id") or str(uuid4()), "created_at": now_iso(), **r} for r in rows]
+        self.insert_rows("comments", rows)
+        return rows
+
+    async def count_comments(self, video_id):
+        return self._count("select count(*) from comments where video_id = ?", (video_id,))
+
+    async def count_comments_many(self, video_ids):
+        marks = ", ".join("?" for _ in video_ids)
+        rows = self._all(f"select video_id, count(*) as n from comments where video_id in ({marks}) group by video_id", video_ids)
+        return Counter({r["video_id"]: r["n"] for r in rows})
+
+    async def list_comments(self, video_id, limit):
+        rows = self._all(
+            "select c.id, c.user_id, c.text, c.created_at, c.username, u.username as _username"
+            " from comments c left join users u on u.id = c.user_id"
+            " where c.video_id = ? order by c.created_at desc limit ?",
+            (video_id, limit),
+        )
+        return [self._embed_user(r) for r in rows]
+
+    # users
+    async def get_user(self, user_id):
+        return self._one(
+            "select id, username, avatar_url, aura, follower_count, following_count,"
+            " (select count(*) from videos v where v.user_id = users.id) as video_count from users where id = ?",
+            (user_id,),
+        )
+
+    async def get_username(self, user_id):
+        u = self._one("select username from users where id = ?", (user_id,))
+        return u["username"] if u else None
+
+    # follows
+    async def is_following(self, follower_id, target_id):
+        return self._one(
+            "select 1 from follows where follower_id = ? and followed_id = ?", (follower_id, target_id)
+        ) is not None
+
+    def _follow_edge(self, write_sql, write_args, delta, follower_id, target_id):
+        with self.lock, self.conn:
+            if self.conn.execute(write_sql, write_args).rowcount:
+                self.conn.execute(
+                    "update users set following_count = max(following_count + ?, 0) where id = ?", (delta, follower_id)
+                )
+                self.conn.execute(
+                    "update users set follower_count = max(follower_count + ?, 0) where id = ?", (delta, target_id)
+                )
+            row = self.conn.execute("select follower_count from users where id = ?", (target_id,)).fetchone()
+        return int(row[0] or 0) if row else 0
+
+    async def follow(self, follower_id, target_id):
+        return self._follow_edge(
+            "insert or ignore into follows (follower_id, followed_id, created_at) values (?, ?, ?)",
+            (follower_id, target_id, now_iso()),
+            1, follower_id, target_id,
+        )
+
+    async def unfollow(self, follower_id, target_id):
+        return self._follow_edge(
+            "delete from follows where follower_id = ? and followed_id = ?",
+            (follower_id, target_id),
+            -1, follower_id, target_id,
+        )
+
+    async def count_followers(self, user_id):
+        return self._count("select count(*) from follows where followed_id = ?", (user_id,))
+
+    async def count_following(self, user_id):
+        return self._count("select count(*) from follows where follower_id = ?", (user_id,))
+
+    async def add_follows(self, follower_id, target_ids):
+        now = now_iso()
+        values = ", ".join("(?, ?, ?)" for _ in target_ids)
+        args = [x for t in target_ids for x in (follower_id, t, now)]
+        return self._returning(
+            f"insert or ignore into follows (follower_id, followed_id, created_at) values {values} returning followed_id", args
+        )
+
+    async def remove_follows(self, follower_id, target_ids):
+        marks = ", ".join("?" for _ in target_ids)
+        return self._returning(
+            f"delete from follows where follower_id = ? and followed_id in ({marks}) returning followed_id",
+            (follower_id, *target_ids),
+        )
+
+    async def bump_user_counts(self, deltas):
+        out = {}
+        with self.lock, self.conn:
+            for uid, (followers, following) in deltas.items():
+                row = self.conn.execute(
+                    "update users set follower_count = max(follower_count + ?, 0),"
+                    " following_count = max(following_count + ?, 0)"
+                    " where id = ? returning follower_count, following_count",
+                    (followers, following, uid),
+                ).fetchone()
+                if row:
+                    out[uid] = (row[0], row[1])
+        return out
+
+    async def user_counts(self, ids):
+        ids = list(ids)
+        marks = ", ".join("?" for _ in ids)
+        rows = self._all(f"select id, follower_count, following_count from users where id in ({marks})", ids)
+        return {r["id"]: (r["follower_count"] or 0, r["following_count"] or 0) for r in rows}
+
+    # for-you feed
+    async def fanout_video(self, video_id, max_followers):
+        v = self._one(
+            "select v.id, v.user_id, v.created_at, u.follower_count from videos v"
+            " join users u on u.id = v.user_id where v.id = ?",
+            (video_id,),
+        )
+        if not v:
+            return 0
+        with self.lock, self.conn:
+            self.conn.execute(
+                "insert or ignore into timelines (user_id, video_id, author_id, created_at) values (?, ?, ?, ?)",
+                (v["user_id"], v["id"], v["user_id"], v["created_at"]),
+            )
+            if (v["follower_count"] or 0) > max_followers:
+                return -1
+            return self.conn.execute(
+                "insert or ignore into timelines (user_id, video_id, author_id, created_at)"
+                " select follower_id, ?, ?, ? from follows where followed_id = ?",
+                (v["id"], v["user_id"], v["created_at"], v["user_id"]),
+            ).rowcount
+
+    async def backfill_timeline(self, user_id, author_id, limit, max_followers):
+        if self._count("select coalesce(max(follower_count), 0) from users where id = ?", (author_id,)) > max_followers:
+            return -1
+        return self._write(
+            "insert or ignore into timelines (user_id, video_id, author_id, created_at)"
+            " select ?, id, user_id, created_at from videos where user_id = ? order by created_at desc limit ?",
+            (user_id, author_id, limit),
+        )
+
+    async def prune_timeline(self, user_id, author_id):
+        self._write("delete from timelines where user_id = ? and author_id = ?", (user_id, author_id))
+
+    async def timeline(self, user_id, limit, after=None):
+        cond, args = self._after(after, "t.created_at", "t.video_id")
+        sql = (
+            f"{FEED_SELECT} from timelines t join videos v on v.id = t.video_id"
+            f" left join users u on u.id = v.user_id where t.user_id = ? and {cond}"
+            " order by t.created_at desc, t.video_id desc limit ?"
+        )
+        return [self._embed_user(r) for r in self._all(sql, (user_id, *args, limit))]
+
+    async def followed_creators(self, user_id, min_followers):
+        rows = self._all(
+            "select f.followed_id from follows f join users u on u.id = f.followed_id"
+            " where f.follower_id = ? and u.follower_count > ?",
+            (user_id, min_followers),
+        )
+        return [r["followed_id"] for r in rows]
+
+    async def creators_videos(self, user_ids, limit, after=None):
+        cond, args = self._after(after)
+        marks = ", ".join("?" for _ in user_ids)
+        sql = (
+            f"{FEED_SELECT} from videos v left join users u on u.id = v.user_id"
+            f" where v.user_id in ({marks}) and {cond} order by v.created_at desc, v.id desc limit ?"
+        )
+        return [self._embed_user(r) for r in self._all(sql, (*user_ids, *args, limit))]
+
+    async def trending_videos(self, user_id, limit, after=None):
+        # disjoint from the following stream: not in the user's timeline, not by a followed creator
+        cond, args = self._after(after, "v.trending_score", "v.id")
+        sql = (
+            f"{FEED_SELECT}, v.trending_score from videos v left join users u on u.id = v.user_id"
+            f" where {cond}"
+            " and not exists (select 1 from timelines t where t.user_id = ? and t.video_id = v.id)"
+            " and not exists (select 1 from follows f where f.follower_id = ? and f.followed_id = v.user_id)"
+            " order by v.trending_score desc, v.id desc limit ?"
+        )
+        return [self._embed_user(r) for r in self._all(sql, (*args, user_id, user_id, limit))]
+
+    # images
+    async def insert_image(self, row):
+        self.insert_rows("images", [row])
+
+    async def list_images(self, user_id, limit, cursor=None):
+        sql = "select * from images where user_id = ?"
+        args = [user_id]
+        if cursor:
+            sql += " and created_at < ?"
+            args.append(cursor)
+        return self._all(sql + " order by created_at desc limit ?", (*args, limit))
+
+    async def search_images(self, user_id, tokens, limit, offset=0):
+        match = " OR ".join(f'"{t}"*' for t in tokens)
+        return self._all(
+            "select i.* from images_fts f join images i on i.rowid = f.rowid"
+            " where images_fts match ? and f.user_id = ?"
+            " order by bm25(images_fts), i.created_at desc limit ? offset ?",
+            (match, user_id, limit, offset),
+        )
+
+    async def get_image(self, image_id):
+        return self._one("select id, storage_path, user_id from images where id = ?", (image_id,))
+
+    async def delete_image(self, image_id):
+        self._write("delete from images where id = ?", (image_id,))
+
+    # generation jobs
+    async def save_generation_job(self, job):
+        row = {k: job[k] for k in JOB_COLS} | {"image": json.dumps(job["image"]) if job["image"] else None}
+        self._write(
+            f"insert or replace into generation_jobs ({', '.join(JOB_COLS)}, updated_at)"
+            f" values ({', '.join('?' for _ in JOB_COLS)}, ?)",
+            (*row.values(), now_iso()),
+        )
+
+    async def get_generation_job(self, job_id):
+        row = self._one(f"select {', '.join(JOB_COLS)} from generation_jobs where id = ?", (job_id,))
+        if row and row["image"]:
+            row["image"] = json.loads(row["image"])
+        return row
+
+
+def make_repo():
+    backend = os.getenv("DATA_BACKEND", "supabase")
+    if backend == "sqlite":
+        return SqliteRepo(os.getenv("SQLITE_PATH", ":memory:"))
+    # the client itself is created in connect(), from the app's lifespan
+    return SupabaseRepo(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
@@ -0,0 +1,105 @@
+import argparse, os, sys, tempfile, threading
+import uvicorn
+from dotenv import load_dotenv
+from uvicorn.supervisors import Multiprocess
+
+# Production entry point: python backend/serve.py --workers 4
+# Each worker is its own process (uvicorn's supervisor replaces any that die
+# or hang) on uvloop + httptools when they are installed. On SIGTERM a worker
+# first answers 503 on /ready for --drain seconds so load balancers stop
+# routing to it, then stops accepting, gives in-flight requests up to
+# --graceful-timeout to finish (WebSockets are closed with 1012) and runs the
+# lifespan shutdown. A second signal skips the drain.
+#
+# Workers share nothing in memory, so with more than one the response cache
+# defaults to the host-wide SQLite file and live deltas to a broker directory;
+# settings that would leave each worker with its own copy are refused.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def available(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+class DrainingServer(uvicorn.Server):
+    def __init__(self, config, drain=0.0):
+        super().__init__(config)
+        self.drain = drain
+        self.draining = False
+
+    def handle_exit(self, sig, frame):
+        if self.draining or not self.drain or not self.started:
+            return super().handle_exit(sig, frame)
+        self.draining = True
+        import app  # already loaded by this worker
+
+        app.start_draining()
+        threading.Timer(self.drain, super().handle_exit, (sig, frame)).start()
+
+
+def shared_state_errors(workers, port):
+    # call after keys.env is loaded, so explicit settings there win over these defaults
+    if workers <= 1:
+        return []
+    os.environ.setdefault("CACHE_BACKEND", "sqlite")
+    os.environ.setdefault("LIVE_BROKER_DIR", os.path.join(tempfile.gettempdir(), f"giggles-live-{port}"))
+    errors = []
+    if os.environ["CACHE_BACKEND"] == "memory":
+        errors.append("CACHE_BACKEND=memory keeps a separate cache per worker (writes would only clear one); use sqlite or off")
+    if not os.environ["LIVE_BROKER_DIR"]:
+        errors.append("LIVE_BROKER_DIR is empty, so /ws deltas would not reach sockets on other workers")
+    if os.getenv("DATA_BACKEND") == "sqlite" and os.getenv("SQLITE_PATH", ":memory:") == ":memory:":
+        errors.append("DATA_BACKEND=sqlite needs SQLITE_PATH set to a file all workers open")
+    return errors
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    p.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    p.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    p.add_argument("--drain", type=float, default=float(os.getenv("DRAIN_SECONDS", "0")))
+    p.add_argument("--graceful-timeout", type=float, default=float(os.getenv("GRACEFUL_TIMEOUT", "30")))
+    # longer than the load balancer's idle timeout, so it never reuses a connection we just closed
+    p.add_argument("--keepalive", type=int, default=int(os.getenv("KEEPALIVE_SECONDS", "75")))
+    p.add_argument("--backlog", type=int, default=int(os.getenv("BACKLOG", "2048")))
+    p.add_argument("--limit-concurrency", type=int, default=int(os.getenv("LIMIT_CONCURRENCY", "0")) or None)
+    args = p.parse_args(argv)
+    load_dotenv(os.path.join(HERE, "keys.env"))
+    errors = shared_state_errors(args.workers, args.port)
+    if errors:
+        p.error(f"--workers {args.workers}: " + "; ".join(errors))
+
+    sys.path.insert(0, HERE)
+    config = uvicorn.Config(
+        "app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if available("uvloop") else "asyncio",
+        http="httptools" if available("httptools") else "h11",
+        lifespan="on",
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=args.keepalive,
+        backlog=args.backlog,
+        limit_concurrency=args.limit_concurrency,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        access_log=False,  # GET /metrics has per-route counts and latencies
+    )
+    server = DrainingServer(config, args.drain)
+    if args.workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+    if not server.started and args.workers == 1:
+        sys.exit(3)  # startup failed, same exit code as uvicorn
+
+
+if __name__ == "__main__":
+    main()
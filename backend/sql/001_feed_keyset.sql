@@ -0,0 +1,4 @@
+-- Keyset pagination for GET /videos: ORDER BY created_at DESC, id DESC
+-- with a (created_at, id) cursor walks this index instead of the table.
+create index if not exists videos_created_at_id_idx
+    on public.videos (created_at desc, id desc);
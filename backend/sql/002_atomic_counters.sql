@@ -0,0 +1,99 @@
+-- Counter maintenance in one round trip per tap. Each function does the row
+-- write and the counter bump in the same transaction and returns the new
+-- value, so concurrent likes can't overwrite each other with stale counts.
+
+alter table public.users add column if not exists follower_count integer not null default 0;
+alter table public.users add column if not exists following_count integer not null default 0;
+
+update public.videos v set
+    like_count = (select count(*) from public.likes l where l.video_id = v.id),
+    comment_count = (select count(*) from public.comments c where c.video_id = v.id);
+update public.users u set
+    follower_count = (select count(*) from public.follows f where f.followed_id = u.id),
+    following_count = (select count(*) from public.follows f where f.follower_id = u.id);
+
+create or replace function public.like_video(p_video_id uuid, p_user_id uuid)
+returns integer language plpgsql as $$
+declare n integer;
+begin
+    insert into public.likes (video_id, user_id) values (p_video_id, p_user_id)
+        on conflict do nothing;
+    if found then
+        update public.videos set like_count = coalesce(like_count, 0) + 1
+            where id = p_video_id returning like_count into n;
+    else
+        select coalesce(like_count, 0) into n from public.videos where id = p_video_id;
+    end if;
+    return coalesce(n, 0);
+end $$;
+
+create or replace function public.unlike_video(p_video_id uuid, p_user_id uuid)
+returns integer language plpgsql as $$
+declare n integer;
+begin
+    delete from public.likes where video_id = p_video_id and user_id = p_user_id;
+    if found then
+        update public.videos set like_count = greatest(coalesce(like_count, 0) - 1, 0)
+            where id = p_video_id returning like_count into n;
+    else
+        select coalesce(like_count, 0) into n from public.videos where id = p_video_id;
+    end if;
+    return coalesce(n, 0);
+end $$;
+
+create or replace function public.add_video_comment(p_video_id uuid, p_user_id uuid, p_text text)
+returns jsonb language plpgsql as $$
+declare c public.comments;
+declare n integer;
+begin
+    insert into public.comments (video_id, user_id, username, text)
+        values (p_video_id, p_user_id, (select username from public.users where id = p_user_id), p_text)
+        returning * into c;
+    update public.videos set comment_count = coalesce(comment_count, 0) + 1
+        where id = p_video_id returning comment_count into n;
+    return jsonb_build_object('comment', to_jsonb(c), 'comment_count', coalesce(n, 0));
+end $$;
+
+create or replace function public.follow_user(p_follower_id uuid, p_followed_id uuid)
+returns integer language plpgsql as $$
+declare n integer;
+begin
+    insert into public.follows (follower_id, followed_id) values (p_follower_id, p_followed_id)
+        on conflict do nothing;
+    if found then
+        update public.users set following_count = following_count + 1 where id = p_follower_id;
+        update public.users set follower_count = follower_count + 1
+            where id = p_followed_id returning follower_count into n;
+    else
+        select follower_count into n from public.users where id = p_followed_id;
+    end if;
+    return coalesce(n, 0);
+end $$;
+
+create or replace function public.unfollow_user(p_follower_id uuid, p_followed_id uuid)
+returns integer language plpgsql as $$
+declare n integer;
+begin
+    delete from public.follows where follower_id = p_follower_id and followed_id = p_followed_id;
+    if found then
+        update public.users set following_count = greatest(following_count - 1, 0) where id = p_follower_id;
+        update public.users set follower_count = greatest(follower_count - 1, 0)
+            where id = p_followed_id returning follower_count into n;
+    else
+        select follower_count into n from public.users where id = p_followed_id;
+    end if;
+    return coalesce(n, 0);
+end $$;
+
+-- Write-behind flushes: apply many coalesced deltas in one statement.
+-- p_deltas = [{"id": "<video uuid>", "likes": 3, "comments": -1}, ...]
+create or replace function public.bump_video_counters(p_deltas jsonb)
+returns table (id uuid, like_count integer, comment_count integer)
+language sql as $$
+    update public.videos v set
+        like_count = greatest(coalesce(v.like_count, 0) + d.likes, 0),
+        comment_count = greatest(coalesce(v.comment_count, 0) + d.comments, 0)
+    from jsonb_to_recordset(p_deltas) as d(id uuid, likes integer, comments integer)
+    where v.id = d.id
+    returning v.id, v.like_count, v.comment_count;
+$$;
@@ -0,0 +1,28 @@
+-- Indexed image search for GET /images/search. Filename words, caption and
+-- the generation prompt feed one tsvector with a GIN index, replacing the
+-- leading-wildcard ILIKE chain that had to scan every row.
+
+alter table public.images add column if not exists caption text;
+alter table public.images add column if not exists prompt text;
+
+alter table public.images add column if not exists search tsvector
+    generated always as (
+        to_tsvector('simple',
+            regexp_replace(coalesce(storage_path, ''), '[^A-Za-z0-9]+', ' ', 'g') || ' ' ||
+            coalesce(caption, '') || ' ' ||
+            coalesce(prompt, ''))
+    ) stored;
+
+create index if not exists images_search_idx on public.images using gin (search);
+create index if not exists images_user_created_idx on public.images (user_id, created_at desc);
+
+-- p_query is a tsquery such as 'cat:* | otter:*' (built by the API from
+-- alphanumeric tokens). Best matches first, newest first among equals.
+create or replace function public.search_images(p_user_id uuid, p_query text, p_limit integer, p_offset integer)
+returns setof public.images language sql stable as $$
+    select i.*
+    from public.images i, to_tsquery('simple', p_query) q
+    where i.user_id = p_user_id and i.search @@ q
+    order by ts_rank(i.search, q) desc, i.created_at desc
+    limit p_limit offset p_offset;
+$$;
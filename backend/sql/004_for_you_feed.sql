@@ -0,0 +1,98 @@
+-- Precomputed inputs for GET /feed/{user_id}: per-user timelines filled on
+-- upload (fan-out on write) and a trending score kept on every video row.
+
+-- Hot score: log10 of engagement plus recency, where 45000 s (12.5 h) of age
+-- is worth one order of magnitude of likes. It only depends on the row, so a
+-- trigger keeps it fresh whenever the counters move and old rows never need
+-- rescoring.
+create or replace function public.video_hot_score(p_likes integer, p_comments integer, p_created_at timestamptz)
+returns double precision language sql immutable as $$
+    select log(greatest(coalesce(p_likes, 0) + 2 * coalesce(p_comments, 0), 1))
+        + extract(epoch from p_created_at) / 45000;
+$$;
+
+alter table public.videos add column if not exists trending_score double precision not null default 0;
+
+create or replace function public.videos_set_trending_score()
+returns trigger language plpgsql as $$
+begin
+    new.trending_score := public.video_hot_score(new.like_count, new.comment_count, coalesce(new.created_at, now()));
+    return new;
+end $$;
+
+drop trigger if exists videos_trending_score on public.videos;
+create trigger videos_trending_score
+    before insert or update of like_count, comment_count on public.videos
+    for each row execute function public.videos_set_trending_score();
+
+update public.videos set trending_score = public.video_hot_score(like_count, comment_count, created_at);
+create index if not exists videos_trending_idx on public.videos (trending_score desc, id desc);
+
+create table if not exists public.timelines (
+    user_id uuid not null references public.users(id) on delete cascade,
+    video_id uuid not null references public.videos(id) on delete cascade,
+    author_id uuid not null references public.users(id) on delete cascade,
+    created_at timestamptz not null,
+    primary key (user_id, video_id)
+);
+create index if not exists timelines_user_created_idx on public.timelines (user_id, created_at desc, video_id desc);
+create index if not exists timelines_user_author_idx on public.timelines (user_id, author_id);
+
+-- Push a new video into the uploader's and every follower's timeline in one
+-- statement. Creators above p_max_followers are skipped (-1); their videos
+-- are pulled at read time instead (followed_creators below).
+create or replace function public.fanout_video(p_video_id uuid, p_max_followers integer)
+returns integer language plpgsql as $$
+declare v public.videos;
+declare n integer;
+begin
+    select * into v from public.videos where id = p_video_id;
+    if v.id is null then
+        return 0;
+    end if;
+    insert into public.timelines (user_id, video_id, author_id, created_at)
+        values (v.user_id, v.id, v.user_id, v.created_at) on conflict do nothing;
+    if (select follower_count from public.users where id = v.user_id) > p_max_followers then
+        return -1;
+    end if;
+    insert into public.timelines (user_id, video_id, author_id, created_at)
+        select f.follower_id, v.id, v.user_id, v.created_at
+        from public.follows f where f.followed_id = v.user_id
+        on conflict do nothing;
+    get diagnostics n = row_count;
+    return n;
+end $$;
+
+-- On follow: copy the creator's latest videos into the follower's timeline.
+create or replace function public.backfill_timeline(p_user_id uuid, p_author_id uuid, p_limit integer, p_max_followers integer)
+returns integer language plpgsql as $$
+declare n integer;
+begin
+    if (select follower_count from public.users where id = p_author_id) > p_max_followers then
+        return -1;
+    end if;
+    insert into public.timelines (user_id, video_id, author_id, created_at)
+        select p_user_id, v.id, v.user_id, v.created_at
+        from public.videos v where v.user_id = p_author_id
+        order by v.created_at desc limit p_limit
+        on conflict do nothing;
+    get diagnostics n = row_count;
+    return n;
+end $$;
+
+-- Followed creators too big for fan-out on write.
+create or replace function public.followed_creators(p_user_id uuid, p_min_followers integer)
+returns table (user_id uuid) language sql stable as $$
+    select f.followed_id
+    from public.follows f join public.users u on u.id = f.followed_id
+    where f.follower_id = p_user_id and u.follower_count > p_min_followers;
+$$;
+
+-- Backfill timelines for existing follows.
+insert into public.timelines (user_id, video_id, author_id, created_at)
+    select f.follower_id, v.id, v.user_id, v.created_at
+    from public.follows f join public.videos v on v.user_id = f.followed_id
+    on conflict do nothing;
+insert into public.timelines (user_id, video_id, author_id, created_at)
+    select v.user_id, v.id, v.user_id, v.created_at from public.videos v
+    on conflict do nothing;
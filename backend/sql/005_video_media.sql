@@ -0,0 +1,9 @@
+-- Outputs of the post-upload transcoding stage (backend/transcode.py). `url`
+-- stays the original upload; clients prefer hls_url once media_status is
+-- 'ready'. Status goes pending -> processing -> ready | failed ('skipped'
+-- when the queue was full, null for videos that were never queued).
+
+alter table public.videos add column if not exists hls_url text;
+alter table public.videos add column if not exists poster_url text;
+alter table public.videos add column if not exists preview_url text;
+alter table public.videos add column if not exists media_status text;
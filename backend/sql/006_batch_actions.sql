@@ -0,0 +1,13 @@
+-- POST /actions/batch writes follows in bulk, then moves every affected
+-- user's counters in one statement.
+-- p_deltas = [{"id": "<user uuid>", "followers": 1, "following": -2}, ...]
+create or replace function public.bump_user_counters(p_deltas jsonb)
+returns table (id uuid, follower_count integer, following_count integer)
+language sql as $$
+    update public.users u set
+        follower_count = greatest(u.follower_count + d.followers, 0),
+        following_count = greatest(u.following_count + d.following, 0)
+    from jsonb_to_recordset(p_deltas) as d(id uuid, followers integer, following integer)
+    where u.id = d.id
+    returning u.id, u.follower_count, u.following_count;
+$$;
@@ -0,0 +1,13 @@
+-- The For You trending stream skips what the following stream can serve:
+-- videos already in the user's timeline and anything by a creator they
+-- follow (creators above the fan-out limit are read from videos directly).
+-- Keyset after (p_score, p_id); both null for the first page.
+create or replace function public.trending_for_user(p_user_id uuid, p_limit integer, p_score double precision, p_id uuid)
+returns setof public.videos language sql stable as $$
+    select v.* from public.videos v
+    where (p_score is null or (v.trending_score, v.id) < (p_score, p_id))
+        and not exists (select 1 from public.timelines t where t.user_id = p_user_id and t.video_id = v.id)
+        and not exists (select 1 from public.follows f where f.follower_id = p_user_id and f.followed_id = v.user_id)
+    order by v.trending_score desc, v.id desc
+    limit p_limit;
+$$;
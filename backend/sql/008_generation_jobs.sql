@@ -0,0 +1,12 @@
+-- Status of POST /generate jobs, written by the worker running each job so
+-- GET /generate/{id} works whichever worker process the poll lands on.
+create table if not exists public.generation_jobs (
+    id uuid primary key,
+    user_id uuid not null,
+    prompt text not null,
+    status text not null check (status in ('queued', 'running', 'done', 'failed')),
+    image jsonb,
+    error text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now()
+);
@@ -0,0 +1,29 @@
+-- Index only what a person would search for: the original filename without
+-- the images/{user_id}/{image_id}_ prefix and extension, plus caption and
+-- prompt. Indexing the whole storage_path put "images", the extension and
+-- every uuid fragment in the index, so prefix queries such as "images",
+-- "png" or "a" matched nearly every row.
+create or replace function public.image_search_text(p_storage_path text, p_caption text, p_prompt text)
+returns text language sql immutable as $$
+    select regexp_replace(
+            regexp_replace(regexp_replace(coalesce(p_storage_path, ''), '^[^/]+/[^/]+/[^/_]*_', ''), '\.[A-Za-z0-9]+$', ''),
+            '[^A-Za-z0-9]+', ' ', 'g')
+        || ' ' || coalesce(p_caption, '') || ' ' || coalesce(p_prompt, '');
+$$;
+
+-- a generated column's expression can't be altered in place
+drop index if exists public.images_search_idx;
+alter table public.images drop column if exists search;
+alter table public.images add column search tsvector
+    generated always as (to_tsvector('simple', public.image_search_text(storage_path, caption, prompt))) stored;
+create index images_search_idx on public.images using gin (search);
+
+-- unchanged, re-created against the new row type
+create or replace function public.search_images(p_user_id uuid, p_query text, p_limit integer, p_offset integer)
+returns setof public.images language sql stable as $$
+    select i.*
+    from public.images i, to_tsquery('simple', p_query) q
+    where i.user_id = p_user_id and i.search @@ q
+    order by ts_rank(i.search, q) desc, i.created_at desc
+    limit p_limit offset p_offset;
+$$;
@@ -0,0 +1,5 @@
+-- GET /users/{id}/liked_videos pages a user's likes newest first by
+-- (created_at, video_id); without this index every page sorts all of them.
+alter table public.likes add column if not exists created_at timestamptz not null default now();
+update public.likes set created_at = now() where created_at is null;
+create index if not exists likes_user_created_idx on public.likes (user_id, created_at desc, video_id desc);
@@ -0,0 +1,17 @@
+import os, sys
+
+# the backend modules import each other by name (uvicorn --app-dir backend)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# set before app is imported: local SQLite data, no cache, no ffmpeg workers,
+# and throwaway credentials for the mocked S3
+os.environ.update(
+    DATA_BACKEND="sqlite",
+    SQLITE_PATH=":memory:",
+    CACHE_BACKEND="off",
+    TRANSCODE_WORKERS="0",
+    AWS_ACCESS_KEY_ID="test",
+    AWS_SECRET_ACCESS_KEY="test",
+    AWS_REGION="us-east-1",
+)
+os.environ.pop("S3_ENDPOINT_URL", None)
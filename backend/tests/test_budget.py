@@ -0,0 +1,14 @@
+import sys
+
+import pytest
+
+import budget
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="worker memory is read from /proc")
+def test_two_workers_start_and_drain_within_budget(monkeypatch):
+    # what the launcher picks for itself with more than one worker, not conftest's
+    # in-process settings (an in-memory database can't be shared)
+    for key in ("SQLITE_PATH", "CACHE_BACKEND"):
+        monkeypatch.delenv(key, raising=False)
+    assert budget.main(budget.parser().parse_args(["--workers", "2"])) == 0
@@ -0,0 +1,44 @@
+import asyncio, os
+
+import httpx, requests
+from moto import mock_aws
+
+PART = 5 * 1024 * 1024  # S3's minimum size for every part but the last
+
+
+def test_presign_put_parts_complete(monkeypatch):
+    with mock_aws():
+        import app as A, bench
+
+        monkeypatch.setattr(A, "UPLOAD_PART_SIZE", PART)
+        monkeypatch.setattr(A, "s3", A.make_s3_client())
+        A.s3.create_bucket(Bucket=A.BUCKET)
+        bench.seed(A.repo, videos=5)
+        data = os.urandom(2 * PART + 1234)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=A.app), base_url="http://t") as c:
+                r = await c.post("/uploads/presign", json={
+                    "user_id": "u1", "filename": "a.mp4", "content_type": "video/mp4", "size": len(data),
+                })
+                assert r.status_code == 200
+                p = r.json()
+                assert p["part_size"] == PART and [x["part_number"] for x in p["parts"]] == [1, 2, 3]
+
+                parts = []
+                for x in reversed(p["parts"]):  # parallel PUTs finish in any order
+                    n = x["part_number"]
+                    put = requests.put(x["url"], data=data[(n - 1) * PART:n * PART])
+                    assert put.ok
+                    parts.append({"part_number": n, "etag": put.headers["ETag"]})
+
+                body = {"id": p["id"], "key": p["key"], "upload_id": p["upload_id"], "parts": parts, "size": len(data)}
+                r = await c.post("/uploads/complete", json={**body, "user_id": "u2"})
+                assert r.status_code == 400  # key belongs to another user
+                r = await c.post("/uploads/complete", json={**body, "user_id": "u1", "caption": "hey"})
+                assert r.status_code == 200, r.text
+                return p
+
+        p = asyncio.run(run())
+        assert A.s3.get_object(Bucket=A.BUCKET, Key=p["key"])["Body"].read() == data
+        assert asyncio.run(A.repo.get_video(p["id"]))["caption"] == "hey"
@@ -0,0 +1,132 @@
+import asyncio, os
+
+# Post-upload media processing with a local ffmpeg. A single ffmpeg run decodes
+# the original once and writes every output from a split filter graph: HLS
+# renditions, a poster frame and a short animated preview. Sources are never
+# upscaled, and a missing audio track is fine, so no ffprobe pass is needed.
+
+RENDITIONS = [
+    # lowest first: players start on the first variant listed
+    {"name": "240p", "height": 240, "kbps": 400},
+    {"name": "480p", "height": 480, "kbps": 1000},
+    {"name": "720p", "height": 720, "kbps": 2500},
+]
+AUDIO_KBPS = 96
+SEGMENT_SECONDS = 4
+PREVIEW_SECONDS = 3
+CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".jpg": "image/jpeg",
+    ".webp": "image/webp",
+}
+
+
+def ffmpeg_args(src, out, renditions=RENDITIONS, threads=0):
+    n = len(renditions)
+    graph = [f"[0:v]split={n + 2}" + "".join(f"[s{i}]" for i in range(n + 2))]
+    graph += [f"[s{i}]scale=-2:'min(ih,{r['height']})'[v{i}]" for i, r in enumerate(renditions)]
+    graph.append(f"[s{n}]thumbnail=50,scale=-2:'min(ih,720)'[poster]")
+    graph.append(
+        f"[s{n + 1}]trim=duration={PREVIEW_SECONDS},setpts=PTS-STARTPTS,fps=10,scale=-2:'min(ih,240)'[preview]"
+    )
+    # -threads is an output option: it has to be repeated for every output to
+    # cap the whole run (0 = let ffmpeg pick per output)
+    per_output = ["-threads", str(threads)] if threads else []
+    args = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-y", "-i", src]
+    if threads:
+        args += ["-filter_complex_threads", str(threads)]
+    args += ["-filter_complex", ";".join(graph)]
+    for i, r in enumerate(renditions):
+        d = os.path.join(out, r["name"])
+        args += per_output + [
+            "-map", f"[v{i}]", "-map", "0:a:0?",
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main", "-pix_fmt", "yuv420p",
+            "-b:v", f"{r['kbps']}k", "-maxrate", f"{r['kbps'] * 11 // 10}k", "-bufsize", f"{r['kbps'] * 2}k",
+            # a keyframe at every segment boundary so players can switch renditions cleanly
+            "-force_key_frames", f"expr:gte(t,n_forced*{SEGMENT_SECONDS})", "-sc_threshold", "0",
+            "-c:a", "aac", "-b:a", f"{AUDIO_KBPS}k", "-ac", "2",
+            "-f", "hls", "-hls_time", str(SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(d, "seg_%03d.ts"), os.path.join(d, "index.m3u8"),
+        ]
+    args += per_output + ["-map", "[poster]", "-frames:v", "1", "-q:v", "3", os.path.join(out, "poster.jpg")]
+    args += per_output + [
+        "-map", "[preview]", "-an", "-c:v", "libwebp_anim", "-loop", "0", "-quality", "60",
+        os.path.join(out, "preview.webp"),
+    ]
+    return args
+
+
+def master_playlist(renditions=RENDITIONS):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for r in renditions:
+        lines += [f"#EXT-X-STREAM-INF:BANDWIDTH={(r['kbps'] + AUDIO_KBPS) * 1000}", f"{r['name']}/index.m3u8"]
+    return "\n".join(lines) + "\n"
+
+
+async def transcode(src, out, renditions=RENDITIONS, timeout=600.0, threads=0):
+    for r in renditions:
+        os.makedirs(os.path.join(out, r["name"]), exist_ok=True)
+    proc = await asyncio.create_subprocess_exec(
+        *ffmpeg_args(src, out, renditions, threads),
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        _, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except BaseException:
+        # timed out or cancelled: don't leave ffmpeg running
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited {proc.returncode}: {err.decode(errors='replace').strip()[-500:]}")
+    with open(os.path.join(out, "master.m3u8"), "w") as f:
+        f.write(master_playlist(renditions))
+
+
+def outputs(out):
+    # (path, key relative to the video's media prefix, content type) for every file written
+    for root, _, files in os.walk(out):
+        for name in files:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, out).replace(os.sep, "/")
+            yield path, rel, CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")
+
+
+class TranscodeQueue:
+    # bounded pool: at most `workers` ffmpeg processes, `max_pending` waiting videos
+    def __init__(self, handler, workers=1, max_pending=100):
+        self.handler = handler  # async (video row) -> None, records its own outcome
+        self.workers = workers
+        self.queue = asyncio.Queue(max_pending)
+        self.tasks = []
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.get_running_loop().create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for t in self.tasks:
+            t.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def submit(self, row):
+        try:
+            self.queue.put_nowait(row)
+        except asyncio.QueueFull:
+            return False
+        self.start()
+        return True
+
+    async def _work(self):
+        while True:
+            row = await self.queue.get()
+            try:
+                await self.handler(row)
+            except Exception:
+                pass
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,45 @@
+import math
+
+# Direct-to-S3 multipart uploads. The API only hands out presigned part URLs
+# and later checks the finished object; media bytes never pass through it.
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+MAX_PARTS = 10000
+
+
+def plan_parts(size, part_size):
+    part_size = max(part_size, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+    return part_size, max(1, math.ceil(size / part_size))
+
+
+def start_multipart(s3, bucket, key, content_type, size, part_size, ttl):
+    part_size, count = plan_parts(size, part_size)
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)["UploadId"]
+    # presigning is local signing, no network round trip per part
+    urls = [
+        s3.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": bucket, "Key": key, "UploadId": upload_id, "PartNumber": n},
+            ExpiresIn=ttl,
+        )
+        for n in range(1, count + 1)
+    ]
+    return {"upload_id": upload_id, "part_size": part_size, "parts": [{"part_number": i + 1, "url": u} for i, u in enumerate(urls)]}
+
+
+def finish_multipart(s3, bucket, key, upload_id, parts, expected_size=None):
+    s3.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": [{"PartNumber": p["part_number"], "ETag": p["etag"]} for p in sorted(parts, key=lambda p: p["part_number"])]},
+    )
+    head = s3.head_object(Bucket=bucket, Key=key)
+    if expected_size is not None and head["ContentLength"] != expected_size:
+        s3.delete_object(Bucket=bucket, Key=key)
+        raise ValueError(f"size mismatch: expected {expected_size}, got {head['ContentLength']}")
+    return head
+
+
+def abort_multipart(s3, bucket, key, upload_id):
+    s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
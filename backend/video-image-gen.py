@@ -1,24 +1,17 @@
-from openai import OpenAI
-import os
+import asyncio, sys
 from dotenv import load_dotenv
-import base64
+from generation import make_provider
+
+# Generate one image from the command line with the same provider the API uses:
+#   python video-image-gen.py "gray tabby cat hugging an otter" cat_and_otter.png
 
 load_dotenv('keys.env')
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def image_gen():
-    response = client.responses.create(
-    model="gpt-4.1-mini",
-    input="Generate an image of gray tabby cat hugging an otter with an orange scarf",
-    tools=[{"type": "image_generation"}],
-    )
-    image_data = [
-    output.result
-    for output in response.output
-    if output.type == "image_generation_call"
-    ]
+async def image_gen(prompt, out):
+    data, _ = await make_provider().generate(prompt)
+    with open(out, "wb") as f:
+        f.write(data)
 
-    if image_data:
-        image_base64 = image_data[0]
-        with open("cat_and_otter.png", "wb") as f:
-            f.write(base64.b64decode(image_base64))
\ No newline at end of file
+if __name__ == "__main__":
+    prompt = sys.argv[1] if len(sys.argv) > 1 else "Generate an image of gray tabby cat hugging an otter with an orange scarf"
+    asyncio.run(image_gen(prompt, sys.argv[2] if len(sys.argv) > 2 else "cat_and_otter.png"))
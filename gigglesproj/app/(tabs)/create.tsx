@@ -20,14 +20,20 @@ import { useRouter } from "expo-router";
 
 const API_BASE = "http://192.168.1.91:8000";
 const USER_ID = "d4705bec-b3ab-4d7c-aa28-a10470adcbd7";
+const UPLOAD_CONCURRENCY = 3; // parts PUT in parallel
 type GridImage = {
   id: string;
   url: string;
+  thumb?: string;
   w?: number;
   h?: number;
   created_at?: string;
 };
 
+// grid cells load the small server-side thumbnail, the preview the original
+const thumbUri = (u?: string) =>
+  u ? (u.startsWith("/") ? `${API_BASE}${u}` : u) : undefined;
+
 const BottomNav = memo(function BottomNav() {
   const insets = useSafeAreaInsets();
   const router = useRouter();
@@ -178,6 +184,7 @@ export default function CreateScreen() {
           .map((it: any) => ({
             id: it.id || it.uuid || String(it.url),
             url: it.url,
+            thumb: thumbUri(it.thumb_url),
             w: it.w,
             h: it.h,
             created_at: it.created_at,
@@ -218,6 +225,7 @@ export default function CreateScreen() {
         .map((it: any) => ({
           id: it.id || it.uuid || String(it.url),
           url: it.url,
+          thumb: thumbUri(it.thumb_url),
           w: it.w,
           h: it.h,
           created_at: it.created_at,
@@ -249,6 +257,7 @@ export default function CreateScreen() {
           .map((it: any) => ({
             id: it.id || it.uuid || String(it.url),
             url: it.url,
+            thumb: thumbUri(it.thumb_url),
             w: it.w,
             h: it.h,
             created_at: it.created_at,
@@ -266,26 +275,65 @@ export default function CreateScreen() {
     };
   }, []);
 
-  const uploadToServer = async (uri: string) => {
+  const postJson = async (path: string, body: any) => {
+    const resp = await fetch(`${API_BASE}${path}`, {
+      method: "POST",
+      headers: { Accept: "application/json", "Content-Type": "application/json" },
+      body: JSON.stringify(body),
+    });
+    const txt = await resp.text();
+    let j: any = null;
+    try {
+      j = txt ? JSON.parse(txt) : null;
+    } catch {}
+    if (!resp.ok) throw new Error(j ? JSON.stringify(j) : txt);
+    return j;
+  };
+
+  // the bytes go straight to S3: presign -> PUT each part -> complete
+  const uploadToServer = async (uri: string, type = "image/jpeg") => {
+    let upload: any = null;
     try {
-      const form = new FormData();
-      form.append("file", {
-        uri,
-        name: `upload.jpg`,
-        type: "image/jpeg",
-      } as any);
-      form.append("user_id", USER_ID);
-      const resp = await fetch(`${API_BASE}/images/upload`, {
-        method: "POST",
-        headers: { Accept: "application/json" },
-        body: form,
+      const blob = await (await fetch(uri)).blob();
+      upload = await postJson("/uploads/presign", {
+        user_id: USER_ID,
+        filename: "upload.jpg",
+        content_type: type,
+        size: blob.size,
+        kind: "image",
+      });
+      // a few parts in flight at once; complete orders them by part number
+      const queue = [...upload.parts];
+      const parts: { part_number: number; etag: string }[] = [];
+      const putNext = async () => {
+        try {
+          for (let p = queue.shift(); p; p = queue.shift()) {
+            const start = (p.part_number - 1) * upload.part_size;
+            const put = await fetch(p.url, {
+              method: "PUT",
+              body: blob.slice(start, start + upload.part_size),
+            });
+            const etag = put.headers.get("ETag");
+            if (!put.ok || !etag) throw new Error(`part ${p.part_number} failed (${put.status})`);
+            parts.push({ part_number: p.part_number, etag });
+          }
+        } catch (e) {
+          queue.length = 0; // stop the other workers; the upload is aborted below
+          throw e;
+        }
+      };
+      await Promise.all(
+        Array.from({ length: Math.min(UPLOAD_CONCURRENCY, queue.length) }, putNext)
+      );
+      const j = await postJson("/uploads/complete", {
+        user_id: USER_ID,
+        id: upload.id,
+        key: upload.key,
+        upload_id: upload.upload_id,
+        parts,
+        kind: "image",
+        size: blob.size,
       });
-      const txt = await resp.text();
-      let j: any = null;
-      try {
-        j = txt ? JSON.parse(txt) : null;
-      } catch {}
-      if (!resp.ok) throw new Error(j ? JSON.stringify(j) : txt);
       const row: GridImage = j?.image || j;
       if (row?.url)
         setImages((prev) => [
@@ -300,6 +348,14 @@ export default function CreateScreen() {
         ]);
     } catch (e) {
       console.warn("Upload failed", e);
+      if (upload?.upload_id)
+        postJson("/uploads/abort", {
+          user_id: USER_ID,
+          id: upload.id,
+          key: upload.key,
+          upload_id: upload.upload_id,
+          kind: "image",
+        }).catch(() => {});
     }
   };
 
@@ -359,7 +415,7 @@ export default function CreateScreen() {
               }}
             >
               <Image
-                source={{ uri: item.url }}
+                source={{ uri: item.thumb || item.url }}
                 style={{
                   width: TILE_SIZE,
                   height: TILE_SIZE,
@@ -66,7 +66,8 @@ async function preload(source: AVPlaybackSource) {
 
 const toItem = (v: any): Item => ({
   id: v?.id ?? "",
-  url: v?.url ?? "",
+  // HLS renditions once the backend has transcoded the upload
+  url: v?.hls_url || v?.url || "",
   user: (v && (v.users?.username || v.user_id?.slice(0, 6))) || "user",
   user_id: v?.user_id ?? "",
   caption: v?.caption ?? "",
@@ -201,6 +202,8 @@ export default function Feed() {
   const tabBarHeight = useBottomTabBarHeight();
   const likeAnims = useRef(new Map<string, Animated.Value>()).current;
   const [items, setItems] = useState<Item[]>([]);
+  const nextCursor = useRef<string | null>(null);
+  const loadingMore = useRef(false);
   const [activeId, setActiveId] = useState<string | null>(null);
   const [likeCounts, setLikeCounts] = useState<Record<string, number>>({});
   const [likedIds, setLikedIds] = useState<Set<string>>(new Set());
@@ -252,9 +255,10 @@ export default function Feed() {
   useEffect(() => {
     (async () => {
       try {
-        const res = await fetch(`${API_BASE}/videos`);
+        const res = await fetch(`${API_BASE}/videos?limit=10`);
         const data = await res.json();
         const mapped: Item[] = (data.videos ?? []).map(toItem);
+        nextCursor.current = data.next_cursor ?? null;
         setItems(mapped);
         if (mapped.length) setActiveId(mapped[0].id);
 
@@ -274,6 +278,33 @@ export default function Feed() {
     })();
   }, []);
 
+  const loadMore = async () => {
+    const cursor = nextCursor.current;
+    if (!cursor || loadingMore.current) return;
+    loadingMore.current = true;
+    try {
+      const res = await fetch(
+        `${API_BASE}/videos?limit=10&cursor=${encodeURIComponent(cursor)}`
+      );
+      const data = await res.json();
+      const mapped: Item[] = (data.videos ?? []).map(toItem);
+      nextCursor.current = data.next_cursor ?? null;
+      setItems((prev) => {
+        const have = new Set(prev.map((p) => p.id));
+        return [...prev, ...mapped.filter((m) => !have.has(m.id))];
+      });
+      setLikeCounts((prev) => {
+        const next = { ...prev };
+        for (const it of mapped) if (!(it.id in next)) next[it.id] = it.likes ?? 0;
+        return next;
+      });
+    } catch (e) {
+      console.warn("Failed to load more videos", e);
+    } finally {
+      loadingMore.current = false;
+    }
+  };
+
   useEffect(() => {
     try {
       likedIds.forEach((id) => {
@@ -508,6 +539,84 @@ export default function Feed() {
     setPaused(false);
   }, [activeId]);
 
+  // live like/comment counts (and new comments) pushed over /ws
+  const ws = useRef<WebSocket | null>(null);
+  const watched = useRef<Set<string>>(new Set());
+
+  useEffect(() => {
+    let closed = false;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+    const connect = () => {
+      const sock = new WebSocket(`${API_BASE.replace(/^http/, "ws")}/ws`);
+      sock.onopen = () => {
+        if (watched.current.size)
+          sock.send(JSON.stringify({ subscribe: [...watched.current] }));
+      };
+      sock.onmessage = (e) => {
+        let msg: any = null;
+        try {
+          msg = JSON.parse(e.data);
+        } catch {
+          return;
+        }
+        if (msg?.type !== "delta") return;
+        const videos: Record<string, any> = msg.videos ?? {};
+        const likes: Record<string, number> = {};
+        let commentCounts = false;
+        for (const [id, d] of Object.entries(videos)) {
+          if (d.like_count != null) likes[id] = Number(d.like_count);
+          if (d.comment_count != null) commentCounts = true;
+        }
+        if (Object.keys(likes).length)
+          setLikeCounts((prev) => ({ ...prev, ...likes }));
+        if (commentCounts)
+          setItems((prev) =>
+            prev.map((it) =>
+              videos[it.id]?.comment_count != null
+                ? { ...it, comments: Number(videos[it.id].comment_count) }
+                : it
+            )
+          );
+        setCommentsByVideo((prev) => {
+          let next = prev;
+          for (const [id, d] of Object.entries(videos)) {
+            // only sheets that were already loaded; our own posts arrive here too
+            if (!d.comments?.length || !prev[id]) continue;
+            const have = new Set(prev[id].map((c) => c.id));
+            const fresh = d.comments.filter((c: Comment) => !have.has(c.id));
+            if (fresh.length) next = { ...next, [id]: [...prev[id], ...fresh] };
+          }
+          return next;
+        });
+      };
+      sock.onclose = () => {
+        if (!closed) retry = setTimeout(connect, 2000);
+      };
+      ws.current = sock;
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      ws.current?.close();
+    };
+  }, []);
+
+  useEffect(() => {
+    // watch the cards around the active one, plus an open comment sheet
+    const i = Math.max(0, items.findIndex((d) => d.id === activeId));
+    const next = new Set(items.slice(Math.max(0, i - 1), i + 3).map((it) => it.id));
+    if (openCommentsFor) next.add(openCommentsFor);
+    const prev = watched.current;
+    const add = [...next].filter((id) => !prev.has(id));
+    const drop = [...prev].filter((id) => !next.has(id));
+    watched.current = next;
+    const sock = ws.current;
+    if (sock?.readyState !== WebSocket.OPEN) return;
+    if (add.length) sock.send(JSON.stringify({ subscribe: add }));
+    if (drop.length) sock.send(JSON.stringify({ unsubscribe: drop }));
+  }, [activeId, items, openCommentsFor]);
+
   const onMomentumScrollEnd = (e: NativeSyntheticEvent<NativeScrollEvent>) => {
     const index = Math.round(e.nativeEvent.contentOffset.y / pageHeight);
     const next = items[index]?.id;
@@ -851,6 +960,8 @@ export default function Feed() {
         snapToAlignment="start"
         showsVerticalScrollIndicator={false}
         onMomentumScrollEnd={onMomentumScrollEnd}
+        onEndReached={loadMore}
+        onEndReachedThreshold={2}
         initialNumToRender={3}
         windowSize={5}
         maxToRenderPerBatch={5}
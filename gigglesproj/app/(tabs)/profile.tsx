@@ -1,4 +1,4 @@
-import React, { useEffect, useMemo, useState, useCallback } from "react";
+import React, { useEffect, useMemo, useState, useCallback, useRef } from "react";
 import {
   View,
   Text,
@@ -43,6 +43,8 @@ export default function Profile() {
   const [activeTab, setActiveTab] = useState<"grid" | "circle">("grid");
   const [videos, setVideos] = useState<any[]>([]);
   const [likedVideos, setLikedVideos] = useState<any[]>([]);
+  const [likedCursor, setLikedCursor] = useState<string | null>(null);
+  const likedLoading = useRef(false);
   const [refreshing, setRefreshing] = useState(false);
   const [isFollowing, setIsFollowing] = useState(false);
 
@@ -75,24 +77,13 @@ export default function Profile() {
       fetch(`${base}/users/${uid}/videos`)
         .then((r) => r.json())
         .catch(() => ({ videos: [] })),
-      fetch(`${base}/users/${uid}/likes`)
+      fetch(`${base}/users/${uid}/liked_videos?limit=12`)
         .then((r) => r.json())
-        .catch(() => ({ video_ids: [] })),
+        .catch(() => ({ videos: [] })),
     ]);
     const stats = statsRes?.user ?? null;
     const videos = vidsRes?.videos ?? [];
-    const ids: string[] = likesRes?.video_ids ?? [];
-    const likes = await Promise.all(
-      ids.slice(0, 12).map(async (id) => {
-        try {
-          const vr = await fetch(`${base}/videos/${id}`);
-          const vj = await vr.json();
-          return vj?.video;
-        } catch {
-          return null;
-        }
-      })
-    ).then((rows) => rows.filter(Boolean) as any[]);
+    const likes: any[] = likesRes?.videos ?? [];
     return { stats, videos, likes, ts: Date.now() };
   }
 
@@ -198,10 +189,11 @@ export default function Profile() {
 
   const loadLiked = useCallback(async () => {
     try {
-      const r = await fetch(`${API_BASE}/users/${targetUserId}/likes`);
+      const r = await fetch(`${API_BASE}/users/${targetUserId}/liked_videos`);
       const j = await r.json();
-      const ids: string[] = j?.video_ids ?? [];
-      if (!ids.length) {
+      const list: any[] = j?.videos ?? [];
+      setLikedCursor(j?.next_cursor ?? null);
+      if (!list.length) {
         setLikedVideos([]);
 
         const current = __pcache.get(targetUserId) || {
@@ -214,19 +206,6 @@ export default function Profile() {
         return;
       }
 
-      const rows = await Promise.all(
-        ids.map(async (id) => {
-          try {
-            const vr = await fetch(`${API_BASE}/videos/${id}`);
-            const vj = await vr.json();
-            return vj?.video || null;
-          } catch {
-            return null;
-          }
-        })
-      );
-
-      const list = rows.filter(Boolean) as any[];
       setLikedVideos(list);
 
       const urls = list
@@ -244,8 +223,30 @@ export default function Profile() {
       __pcache.set(targetUserId, { ...current, likes: list, ts: Date.now() });
     } catch {
       setLikedVideos([]);
+      setLikedCursor(null);
     }
   }, [targetUserId, prefetchAssets]);
+
+  // next page of likes (newest first) when the liked grid is scrolled to the end
+  const loadMoreLiked = useCallback(async () => {
+    if (!likedCursor || likedLoading.current) return;
+    likedLoading.current = true;
+    try {
+      const r = await fetch(
+        `${API_BASE}/users/${targetUserId}/liked_videos?cursor=${encodeURIComponent(likedCursor)}`
+      );
+      const j = await r.json();
+      const more: any[] = j?.videos ?? [];
+      setLikedVideos((prev) => {
+        const seen = new Set(prev.map((v: any) => v.id));
+        return [...prev, ...more.filter((v: any) => !seen.has(v.id))];
+      });
+      setLikedCursor(j?.next_cursor ?? null);
+    } catch {
+    } finally {
+      likedLoading.current = false;
+    }
+  }, [targetUserId, likedCursor]);
   useEffect(() => {
     if (activeTab === "grid")
       prefetchAssets(videos.slice(0, 12).map((v: any) => v.url));
@@ -635,6 +636,8 @@ export default function Profile() {
             paddingBottom: insets.bottom + 100,
           }}
           data={likedVideos}
+          onEndReached={loadMoreLiked}
+          onEndReachedThreshold={0.5}
           refreshControl={
             <RefreshControl
               refreshing={refreshing && activeTab === "circle"}